@@ -0,0 +1,135 @@
+import threading
+import time
+import traceback
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import config
+from src.progress import Progress
+
+# Long pipelines (extract, labels, list algorithm) run here instead of in the Flask request thread
+JOB_WORKERS = getattr(config, "JOB_WORKERS", 2)
+# Finished jobs kept around for /jobs/<id> lookups; oldest are dropped first
+JOB_HISTORY = getattr(config, "JOB_HISTORY", 50)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_lock = threading.Lock()
+_executor = None
+_jobs = {}
+_workbook_locks = {}
+
+class Job:
+    def __init__(self, kind, workbook):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.workbook = workbook
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.artifact = None # file path produced by the job (e.g. the merged label PDF)
+        self.progress = Progress()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "workbook": self.workbook,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "has_artifact": bool(self.artifact),
+            "progress": self.progress.snapshot()
+        }
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+def _workbook_lock(workbook):
+    # Caller holds _lock
+    if workbook not in _workbook_locks:
+        _workbook_locks[workbook] = threading.Lock()
+    return _workbook_locks[workbook]
+
+def _prune():
+    # Caller holds _lock
+    finished = [job for job in _jobs.values() if not job.active]
+    for job in sorted(finished, key=lambda j: j.finished_at or 0)[:max(0, len(finished) - JOB_HISTORY)]:
+        del _jobs[job.id]
+
+def _run(job, fn, args, kwargs):
+    # Only one writer per workbook at a time; other jobs on the same file wait here as "queued"
+    with _lock:
+        writer_lock = _workbook_lock(job.workbook) if job.workbook else nullcontext()
+    with writer_lock:
+        job.status = RUNNING
+        job.started_at = time.time()
+        print(f"Job {job.id} ({job.kind}) started")
+        try:
+            outcome = fn(*args, progress=job.progress, **kwargs)
+            if isinstance(outcome, dict):
+                job.artifact = outcome.pop("artifact", None)
+            job.result = outcome
+            job.status = SUCCEEDED
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            # Also wakes any event stream waiting on this job
+            job.progress.finish()
+            print(f"Job {job.id} ({job.kind}) {job.status} in {job.finished_at - job.started_at:.1f}s")
+
+def submit(kind, fn, *args, workbook=None, **kwargs):
+    """
+        Queues fn(*args, progress=<the job's Progress>, **kwargs) on the job pool and returns right away.
+        A job of the same kind already queued/running on the same workbook is coalesced:
+        the caller gets that job back instead of a second run.
+        If fn returns a dict with an "artifact" key, that path is kept as the job's artifact.
+
+        Returns: (Job, created)
+        Used: app.py
+    """
+    with _lock:
+        for job in _jobs.values():
+            if job.active and job.kind == kind and job.workbook == workbook:
+                return job, False
+        job = Job(kind, workbook)
+        _jobs[job.id] = job
+        _prune()
+    _get_executor().submit(_run, job, fn, args, kwargs)
+    return job, True
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+def latest_job():
+    """The running job if there is one, else the most recently submitted job (or None)."""
+    with _lock:
+        jobs = sorted(_jobs.values(), key=lambda j: (j.status == RUNNING, j.submitted_at), reverse=True)
+    return jobs[0] if jobs else None
+
+def list_jobs():
+    """Every known job, newest first, as dicts."""
+    with _lock:
+        jobs = sorted(_jobs.values(), key=lambda j: j.submitted_at, reverse=True)
+    return [job.to_dict() for job in jobs]
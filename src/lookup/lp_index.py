@@ -0,0 +1,52 @@
+import threading
+import pandas as pd
+from src.lookup import tools_cache
+from src.lookup.sku_index import get_sku
+
+_lock = threading.Lock()
+_lp_map = None
+_lp_signature = None
+
+def _build_lp_map():
+    """
+        Vectorized version of the old LP scan: a GP# is a possible eBay purchase when
+        QOH == 0 and L/P > 0 on the LP sheet (columns B:D: Omni5, QOH, L/P).
+    """
+    df = tools_cache.get_sheet("LP").iloc[:, 1:4]
+    qoh = pd.to_numeric(df["QOH"], errors="coerce")
+    price = pd.to_numeric(df["L/P"], errors="coerce")
+    mask = (qoh == 0) & (price > 0)
+    gps = df.loc[mask, "Omni5"].astype(str).str.strip()
+    return dict(zip(gps, price[mask]))
+
+def get_lp_map():
+    """
+        {GP#: L/P price} for out-of-stock GP#s. Built once per DailyOutTools.xlsx version
+        and shared; treat as read-only.
+    """
+    global _lp_map, _lp_signature
+    sig = tools_cache.recent_signature()
+    if _lp_map is None or _lp_signature != sig:
+        with _lock:
+            if _lp_map is None or _lp_signature != sig:
+                _lp_map = _build_lp_map()
+                _lp_signature = sig
+    return _lp_map
+
+def flags_for_skus(skus):
+    """
+        Resolves the LP flags for a whole batch of SKUs in one pass over their Part # lists.
+
+        Returns: {SKU: {"is_ebay": bool, "lp_info": "GP# ($price), ..."}}
+                 SKUs with no DailyOutTools row or no LP hit map to is_ebay False
+    """
+    lp_map = get_lp_map()
+    flags = {}
+    for sku in set(skus):
+        sku_info = get_sku(sku)
+        found = []
+        if sku_info:
+            raw_parts = str(sku_info.get("Part #", "") or "")
+            found = [f"{p} (${lp_map[p]})" for p in (p.strip() for p in raw_parts.split(",")) if p and p in lp_map]
+        flags[sku] = {"is_ebay": bool(found), "lp_info": ", ".join(found)}
+    return flags
@@ -0,0 +1,54 @@
+import threading
+from types import MappingProxyType
+from src.lookup import tools_cache
+
+# Sheets searched in priority order: a SKU found in DB shadows the same SKU in Nonmounts
+SKU_SHEETS = ["DB", "Nonmounts"]
+
+_index = None
+_index_signature = None
+_lock = threading.Lock()
+
+def _build_index():
+    """
+        Flattens the cached DailyOutTools sheets DB + Nonmounts into {SKU: record}.
+        SKUs are normalized to stripped strings. Nonmounts rows get "Interchange (not in order)"
+        from their Category column, the same as the old per-lookup copy did.
+        Records and the index itself are read-only views so worker threads can share them.
+    """
+    sheets = tools_cache.load_sheets()
+    index = {}
+    for sheet in SKU_SHEETS:
+        df = sheets[sheet]
+        skus = df["SKU"].astype(str).str.strip()
+        for sku, record in zip(skus, df.to_dict("records")):
+            if sku in index:
+                continue
+            record["SKU"] = sku
+            if sheet == "Nonmounts":
+                record["Interchange (not in order)"] = record.get("Category", None)
+            index[record["SKU"]] = MappingProxyType(record)
+
+    print(f"SKU index built: {len(index)} SKUs")
+    return MappingProxyType(index)
+
+def get_index():
+    """Returns the shared SKU index, (re)building it on first use or after DailyOutTools.xlsx changes."""
+    global _index, _index_signature
+    sig = tools_cache.recent_signature()
+    if _index is None or _index_signature != sig:
+        with _lock:
+            if _index is None or _index_signature != sig:
+                _index = _build_index()
+                _index_signature = sig
+    return _index
+
+def get_sku(sku):
+    """
+        O(1) lookup of a SKU's DailyOutTools row (DB first, then Nonmounts).
+
+        Returns: read-only mapping of the sheet's headers to values, or None
+    """
+    if sku is None:
+        return None
+    return get_index().get(str(sku).strip())
@@ -0,0 +1,94 @@
+import os
+import pickle
+import threading
+import time
+import pandas as pd
+import config
+
+TOOLS_FILE = getattr(config, "TOOLS_FILE", "data/DailyOutTools.xlsx")
+
+# Parsed copy of the sheets we use, rebuilt whenever the workbook's mtime/size change
+CACHE_PATH = getattr(config, "TOOLS_CACHE_PATH", "data/DailyOutTools.cache.pkl")
+CACHED_SHEETS = ["DB", "Nonmounts", "LP"]
+
+# Bump when the cached layout changes so old pickles are rebuilt
+CACHE_FORMAT = 1
+
+# How often hot lookups re-stat the workbook; edits show up within this many seconds
+SIGNATURE_CHECK_SECONDS = getattr(config, "TOOLS_SIGNATURE_CHECK_SECONDS", 5)
+
+_lock = threading.Lock()
+_sheets = None
+_signature = None
+_checked_signature = None
+_checked_at = 0.0
+
+def signature():
+    """
+        (mtime_ns, size) of DailyOutTools.xlsx; changes whenever the file is re-saved.
+        Always stats the file, and refreshes the value recent_signature() hands out.
+    """
+    global _checked_signature, _checked_at
+    st = os.stat(TOOLS_FILE)
+    _checked_signature, _checked_at = (st.st_mtime_ns, st.st_size), time.monotonic()
+    return _checked_signature
+
+def recent_signature():
+    """
+        signature(), re-stat'ed at most once every SIGNATURE_CHECK_SECONDS.
+        Used by the per-SKU lookups so a big order batch doesn't stat the workbook once per SKU.
+    """
+    if _checked_signature is None or time.monotonic() - _checked_at >= SIGNATURE_CHECK_SECONDS:
+        return signature()
+    return _checked_signature
+
+def _read_pickle(sig):
+    try:
+        with open(CACHE_PATH, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if cached.get("format") != CACHE_FORMAT or cached.get("signature") != sig:
+        return None
+    return cached["sheets"]
+
+def _write_pickle(sig, sheets):
+    tmp_path = f"{CACHE_PATH}.tmp"
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"format": CACHE_FORMAT, "signature": sig, "sheets": sheets}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Atomic swap so a concurrent reader never sees half a file
+        os.replace(tmp_path, CACHE_PATH)
+    except OSError as e:
+        print(f"DailyOutTools cache write error: {e}")
+
+def load_sheets():
+    """
+        Returns {sheet name: DataFrame} for CACHED_SHEETS.
+
+        Served from memory while the workbook is unchanged, then from the pickle on disk,
+        and only parses the xlsx when neither matches the workbook's current signature.
+        Callers must treat the frames as read-only; they're shared.
+    """
+    global _sheets, _signature
+    sig = recent_signature()
+    if _sheets is not None and _signature == sig:
+        return _sheets
+
+    with _lock:
+        if _sheets is not None and _signature == sig:
+            return _sheets
+
+        sheets = _read_pickle(sig)
+        if sheets is None:
+            print("DailyOutTools.xlsx changed, rebuilding cache...")
+            sheets = pd.read_excel(TOOLS_FILE, sheet_name=CACHED_SHEETS)
+            _write_pickle(sig, sheets)
+
+        _sheets, _signature = sheets, sig
+        return sheets
+
+def get_sheet(name):
+    """One cached sheet of DailyOutTools.xlsx (see CACHED_SHEETS)."""
+    return load_sheets()[name]
@@ -1,25 +1,48 @@
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import pandas as pd
-from src.shipstation.client import get_shipments
+from src.shipstation.client import get_shipments, count_awaiting_shipments, set_awaiting_count
 import os
 from src.lookup.sku_lookup import lookup_sku
+from src.lookup import lp_index, tools_cache
+from src.workbook_archive import archive_old_daily_sheets
+from src.shipping.decision_log import LOG_HEADERS
+from src.shipping import decision_store
+from src import progress as job_progress
+from src.progress import Progress
 from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from collections import Counter, defaultdict
 from generate_test_data import generate_test_orders
-from src.shipping.engine import get_carrier_service
+from src.shipping.engine import get_carrier_service, classify_skus
 from src.shipping.engine import get_sku_info_from_dailyouttools, get_weight_from_pkg_string
-from src.shipping.optimizer import shop_and_optimize
-from src.shipstation.rates import get_live_rates
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.shipping.optimizer import shop_and_optimize, prefetch_rates
+from src.shipstation.rates import get_live_rates, get_order_address, cache_orders, winner_strategy, flush_cancellations
+from src.shipstation.rate_limit import order_workers, V2_MAX_CONCURRENCY
+from src.shipstation import rate_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time
 import config
 import re
+from zoneinfo import ZoneInfo
+
+# Re-rate only new/changed orders on repeat extracts (see extract_todays_shipments)
+INCREMENTAL_EXTRACT = getattr(config, "INCREMENTAL_EXTRACT", True)
+
+# Delta fetches start this far before the previous sync so clock skew can't drop an order
+SYNC_OVERLAP_MINUTES = 10
+
+# V1 reads modifyDateStart in the ShipStation account's time zone, not this machine's
+SHIPSTATION_TZ = ZoneInfo(getattr(config, "SHIPSTATION_TZ", "America/Los_Angeles"))
 
 base_font = Font(size=9)
 store_font = Font(size=12,bold=True)
 
 WRAP_COLUMNS = {"Part#", "Interchange #", "Attention"}
+CENTER_COLUMNS = {"Sequence", "Carrier", "Service", "Box", "Shipping Price", "Qty"}
+
+# Columns merged across every row of a multi-item order (Sequence, Order #, Carrier .. Attention)
+MERGED_COLUMNS = [1, 2, 7, 8, 9, 10, 11]
 
 UPS_STATES = {
     # Abbreviations
@@ -47,6 +70,49 @@ all_border = Border(
     bottom=thin
 )
 
+# Shared styles, created once instead of per cell
+header_font = Font(size=8, color="FFFFFF")
+black_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
+red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+blue_fill = PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid")
+green_savings = PatternFill(start_color="C6EFCE", fill_type="solid") # Light Green
+red_savings = PatternFill(start_color="FFC7CE", fill_type="solid")   # Light Red
+total_fill = PatternFill(start_color="FFFF00", fill_type="solid")
+center_align = Alignment(horizontal="center")
+left_align = Alignment(horizontal="left")
+merged_center_align = Alignment(vertical="center", horizontal="center")
+merged_right_align = Alignment(vertical="center", horizontal="right")
+ebay_font = Font(size=9, bold=True)
+total_font = Font(bold=True, size=10)
+log_header_font = Font(bold=True, color="FFFFFF")
+MONEY_FORMAT = '"$"#,##0.00'
+
+# Named styles for the daily sheet's bordered cells; one style assignment per cell instead of three
+DAILY_STYLES = {
+    "daily_cell": {},
+    "daily_center": {"alignment": Alignment(horizontal="center")},
+    "daily_right": {"alignment": Alignment(horizontal="right")},
+    "daily_wrap": {"alignment": Alignment(wrap_text=True, horizontal="left", vertical="center")},
+    "daily_money": {"alignment": Alignment(horizontal="center"), "number_format": MONEY_FORMAT},
+    "daily_note": {"alignment": Alignment(horizontal="left", vertical="center")},
+}
+
+COLUMN_STYLES = {
+    col_name: "daily_wrap" if col_name in WRAP_COLUMNS
+    else "daily_right" if col_name == "Order #"
+    else "daily_center" if col_name in CENTER_COLUMNS
+    else "daily_cell"
+    for col_name in HEADERS
+}
+
+def register_daily_styles(wb):
+    """Adds the DAILY_STYLES named styles to wb (once; they're saved with the workbook)."""
+    existing = set(wb.named_styles)
+    for name, attrs in DAILY_STYLES.items():
+        if name not in existing:
+            wb.add_named_style(NamedStyle(name=name, font=base_font, border=all_border, **attrs))
+
 def get_store_name(store_id):
     """
         Converts the store_id into Actual Platform Store Name
@@ -58,38 +124,6 @@ def get_store_name(store_id):
         return "Unknown Store"
     return config.STORE_MAP.get(store_id, f"Store {store_id}")
 
-def count_awaiting_shipments():
-    """
-        Displays the number of orders in awaiting shipment from shipstation
-        Returns: # of orders
-        Used: app.py
-    """
-    shipments = get_shipments() 
-    awaiting = [s for s in shipments if s['orderStatus'] == 'awaiting_shipment'] 
-    return len(awaiting)
-
-# Method to help determine if an order has ebay Purchase GP#
-def load_lp_data():
-    """
-        Reads DailyOutTools.xlsx (LP sheet) and find GP#s out of stock to flag them for ebay purchase
-        Returns: lp_map dictionary GP#s and its LP Price
-        Used: main.py
-    """
-    lp_path = "data/DailyOuttools.xlsx"
-    try:
-        df_lp = pd.read_excel(lp_path, sheet_name="LP", usecols="B:D")
-        lp_map = {}
-        for _, row in df_lp.iterrows():
-            gp = str(row['Omni5']).strip()
-            qoh = row.get('QOH', 0)
-            price = row.get('L/P', 0)
-            if qoh == 0 and price > 0:
-                lp_map[gp] = price
-        return lp_map
-    except Exception as e:
-        print(f"LP lookup error: {e}")
-        return {}
-    
 def create_list_algorithm(wb, parts_list):
 
     """
@@ -163,7 +197,16 @@ def create_list_algorithm(wb, parts_list):
 
     ws.print_area = f'A1:I{page_offset}'
 
-def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
+def shop_args(row, decision, sku_info):
+    """shop_and_optimize keyword arguments for a SHOP_RATES order (shared by fetch_order_data and the run's rate prefetch)."""
+    _, _, _, w, dims = decision
+    order_no = row.get("Order #")
+    return {"order_no": order_no, "weight": w, "dims": dims, "to_state": row.get("State"), "to_zip": row.get("Zip"),
+            "sku_info": sku_info, "store_id": row.get("Store"), "is_residential": None,
+            # Cached in extract_todays_shipments, so this is a dict lookup rather than a V1 call
+            "order_info": get_order_address(order_no)}
+
+def fetch_order_data(row, order_total_qty, sku_info, lp_flags, decision=None, prefetched=None):
     """
         extract_todays_shipments -> write_grouped_excel -> fetch_order_data
         Method runs in parallel to calculate shipping costs, determine the best carrier,
@@ -171,28 +214,25 @@ def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
         
         :param row: row is the store_row extracted from extract_todays_shipments [values are in extract_todays_shipments]
         :param sku_info: SKU row coming from DailyOutTools; [values are the headers from the sheet 'DB' or 'Nonmounts' from DailyOutTools]
-        :param lp_lookup: GP#s dictionary that has GP# and its LP Price coming from 'LP' Sheet inside DailyOutTools
+        :param lp_flags: per-SKU {"is_ebay", "lp_info"} precomputed from the 'LP' Sheet inside DailyOutTools (lp_index.flags_for_skus)
+        :param decision: the SKU's precomputed get_carrier_service decision (engine.classify_skus); looked up when omitted
+        :param prefetched: this order's shop results from optimizer.prefetch_rates, if the run rated it up front
     """
     order_no = row.get("Order #")
     shippingDB_cost = float(sku_info.get("Shipping DB", 0) or 0) if sku_info else 0.0
     total_qty = order_total_qty.get(order_no, 0)
     
-    # LP Logic
-    lp_found_info = []
-    is_ebay_purchase = False
-    if sku_info:
-        raw_parts = str(sku_info.get("Part #", "") or "")
-        parts_list = [p.strip() for p in raw_parts.split(",") if p.strip()]
-        for p in parts_list:
-            if p in lp_lookup:
-                lp_found_info.append(f"{p} (${lp_lookup[p]})")
-                is_ebay_purchase = True
+    # LP Logic (resolved for every SKU in the run before the executor starts)
+    lp_flag = lp_flags.get(row.get("SKU")) or {}
+    is_ebay_purchase = lp_flag.get("is_ebay", False)
+    lp_info = lp_flag.get("lp_info", "")
 
     # Decision Logic
-    try:
-        decision = get_carrier_service(row)
-    except Exception as e:
-        decision = None
+    if decision is None:
+        try:
+            decision = get_carrier_service(row)
+        except Exception as e:
+            decision = None
     best_rate = None
     best_rate_cost = 0.0
     full_service_display = "N/A"
@@ -213,8 +253,10 @@ def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
         c, s, p, w, dims = (None, None, None, None, None)
     else:
         c, s, p, w, dims = decision
+        # Cached in extract_todays_shipments, so this is a dict lookup rather than a V1 call
+        order_info = get_order_address(order_no)
         if c != "SHOP_RATES":
-            rate_results, _ = get_live_rates(order_no, c, s, p, w, dims, row.get("State"), row.get("Zip"),is_residential=False)
+            rate_results, _ = get_live_rates(order_no, c, s, p, w, dims, row.get("State"), row.get("Zip"),is_residential=False, order_info=order_info, strategy=winner_strategy())
             if rate_results:
                 best_rate = rate_results[0]
                 raw_pkg = best_rate.get("packageType")
@@ -226,8 +268,7 @@ def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
                     "comparison_log": f"{s_name} only"
                 })
         else:
-            store_id = row.get("Store")
-            best_rate = shop_and_optimize(order_no, w, dims, row.get("State"), row.get("Zip"), sku_info,store_id=store_id, is_residential=False)
+            best_rate = shop_and_optimize(**shop_args(row, decision, sku_info), prefetched=prefetched)
         
         best_rate_cost = best_rate.get("shipmentCost", 0.0) if best_rate else 0.0
         
@@ -285,7 +326,7 @@ def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
                 "Delivery Time": f"{(date.fromisoformat(best_rate.get('estimated_delivery_date')[:10]) - date.today()).days} Days" if best_rate.get('estimated_delivery_date') else "N/A",
                 "Arrival": best_rate.get("estimated_delivery_date", "N/A")[:10],
                 "Fallback": "FALLBACK" if best_rate.get("is_priority_fallback") else "",
-                "LP": ", ".join(lp_found_info),
+                "LP": lp_info,
                 "Weight": current_weight,
                 "Dims": f"{int(dims[0])}x{int(dims[1])}x{int(dims[2])}" if dims else "",
                 "Shipping Cost":best_rate_cost,
@@ -301,7 +342,7 @@ def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
                 "decision_msg": decision_msg,
                 "savings": savings,
                 "is_ebay": is_ebay_purchase,
-                "lp_info": ", ".join(lp_found_info),
+                "lp_info": lp_info,
                 "excel_mapping": {"Carrier": carrier_val, "Service": service_val, "Box": box_val},
                 "log_entry": log_entry,
                 "decision": decision
@@ -316,8 +357,7 @@ def fetch_order_data(row, order_total_qty, sku_info, lp_lookup):
         "savings": 0.0
     }
 
-progress_status = {"percent": 0}
-def write_grouped_excel(store_rows, output_file):
+def write_grouped_excel(store_rows, output_file, fingerprints=None, reuse=False, resume=False, progress=None):
 
     """
         extract_todays_shipments -> write_grouped_excel -> fetch_order_data
@@ -325,12 +365,22 @@ def write_grouped_excel(store_rows, output_file):
 
         Using the processed data from store_rows, this method builds the final Excel Workbook.
         Manages complex formatting, merge cells for multi-item orders, creates the Decision Log Sheet as well.
+        fingerprints ({Order #: input hash}) are stored with each decision; with reuse=True, orders whose
+        fingerprint matches a decision stored earlier today take that result instead of being re-rated.
+        Every result is checkpointed to the decision store as soon as it finishes; resume=True continues
+        today's interrupted run and only rates the orders it hadn't finished.
+        progress: the job's Progress (rate shopping / write workbook / build list stages)
         Used: main.py
     """
 
-    global progress_status
-    progress_status = {"percent": 0}
+    progress = progress or Progress(job_progress.EXTRACT_STAGES)
     today_day = str(datetime.today().day)
+
+    # Move earlier days out first so the workbook we load (and save) holds only today's sheets
+    try:
+        archive_old_daily_sheets(output_file)
+    except Exception as e:
+        print(f"Archive error (continuing with full workbook): {e}")
     
     try:
         wb = load_workbook(output_file)
@@ -343,6 +393,16 @@ def write_grouped_excel(store_rows, output_file):
         print("Error: Template sheet 'Copy' not found.")
         return
 
+    # Every priced order is persisted under this run; the sheets below are an export of it
+    interrupted = decision_store.latest_run(run_date=date.today().isoformat(), status=decision_store.RUN_RUNNING) if resume else None
+    if interrupted:
+        # Checkpointed orders of the interrupted run match their fingerprints, so they're reused below
+        run_id = interrupted["run_id"]
+        reuse = True
+        print(f"Resuming run {run_id}")
+    else:
+        run_id = decision_store.start_run(output_file, today_day)
+
     ### CHANGE: Scrub the 'Copy' template of any old data/merges below headers
     template = wb['Copy']
     template.delete_rows(3, template.max_row)
@@ -355,21 +415,16 @@ def write_grouped_excel(store_rows, output_file):
     ws = wb.copy_worksheet(template)
     ws.title = today_day
 
+    register_daily_styles(wb)
+
     # Header Formatting for Daily Sheet
-    header_font = Font(size=8, color="FFFFFF")
-    black_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
     for col_idx, col_name in enumerate(HEADERS, start=1):
         cell = ws.cell(row=1, column=col_idx, value=col_name)
         cell.font = header_font
         cell.fill = black_fill
-        cell.alignment = Alignment(horizontal="center")
+        cell.alignment = center_align
         ws.cell(row=2, column=col_idx).fill = black_fill
 
-    # Styles (Defining these once for performance)
-    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    yellow_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-    blue_fill = PatternFill(start_color="BDD7EE", end_color="BDD7EE", fill_type="solid")
-
     # Pre-compute totals for highlighting
     customer_counter = Counter()
     order_total_qty = defaultdict(int)
@@ -394,35 +449,118 @@ def write_grouped_excel(store_rows, output_file):
                 unique_rows_to_fetch.append(row)
                 seen_orders.add(order_no)
 
-    # reads the DailyOutTools to find possible ebay purchase GP#s
-    lp_lookup = load_lp_data()
+    # reads the DailyOutTools to find possible ebay purchase GP#s, for every SKU in one pass
+    try:
+        lp_flags = lp_index.flags_for_skus(r.get("SKU") for r in unique_rows_to_fetch)
+    except Exception as e:
+        print(f"LP lookup error: {e}")
+        lp_flags = {}
+
+    # Carrier decisions for every SKU in the run, straight from the precomputed decision table
+    try:
+        decisions = classify_skus(r.get("SKU") for r in unique_rows_to_fetch)
+    except Exception as e:
+        print(f"Decision table error: {e}")
+        decisions = {}
 
     # Parallel Fetching Orders
     total_unique = len(unique_rows_to_fetch)
     rate_results_map = {}
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        # Use submit instead of map to track individual completions
-        future_to_order = {
-            executor.submit(fetch_order_data, r, order_total_qty, get_sku_info_from_dailyouttools(r.get("SKU")), lp_lookup): r.get("Order #") 
-            for r in unique_rows_to_fetch
-        }
-        
-        completed_fetch = 0
-        for future in as_completed(future_to_order):
-            res = future.result()
+    rows_by_order = {r.get("Order #"): r for r in unique_rows_to_fetch}
+
+    def checkpoint(results):
+        # Persist finished results right away so a crash mid-run only loses in-flight orders
+        try:
+            decision_store.save_results(run_id, [
+                (res["order_no"], rows_by_order[res["order_no"]].get("SKU"), res, (fingerprints or {}).get(res["order_no"]))
+                for res in results
+            ])
+        except Exception as e:
+            print(f"Decision store error: {e}")
+
+    prefetched = {}
+
+    def rate_order(r):
+        # Runs on the worker, so each result is checkpointed the moment it's ready
+        res = fetch_order_data(r, order_total_qty, get_sku_info_from_dailyouttools(r.get("SKU")), lp_flags, decisions.get(r.get("SKU")),
+                               prefetched.get(r.get("Order #")))
+        checkpoint([res])
+        return res
+
+    reused = {}
+    if reuse and fingerprints:
+        try:
+            reused = decision_store.reusable_results({
+                r.get("Order #"): fingerprints.get(r.get("Order #")) for r in unique_rows_to_fetch
+            })
+        except Exception as e:
+            print(f"Decision store error (re-rating everything): {e}")
+        print(f"Reusing {len(reused)} of {total_unique} stored decisions")
+
+    rows_to_rate = []
+    for r in unique_rows_to_fetch:
+        if r.get("Order #") in reused:
+            rate_results_map[r.get("Order #")] = reused[r.get("Order #")]
+            continue
+        decision = decisions.get(r.get("SKU"))
+        if order_total_qty.get(r.get("Order #"), 0) > 1 or decision is None or decision[0] == "ERROR":
+            # Rejected orders never make an API call, so resolve them here instead of occupying a worker
+            res = fetch_order_data(r, order_total_qty, get_sku_info_from_dailyouttools(r.get("SKU")), lp_flags, decision)
             rate_results_map[res["order_no"]] = res
-            
-            completed_fetch += 1
-            progress_status["percent"] = int((completed_fetch / total_unique) * 100)
+        else:
+            rows_to_rate.append(r)
+    checkpoint(rate_results_map.values())
+
+    progress.start_stage(job_progress.RATE_SHOPPING, total=total_unique, done=len(rate_results_map))
+
+    # Every shopping order's quotes go out as one batch, so orders to the same address/box share
+    # temporary shipments; the order workers below then only verify winners and build results
+    try:
+        prefetched = prefetch_rates([
+            shop_args(r, decisions[r.get("SKU")], get_sku_info_from_dailyouttools(r.get("SKU")))
+            for r in rows_to_rate if decisions[r.get("SKU")][0] == "SHOP_RATES"
+        ])
+    except Exception as e:
+        print(f"Rate prefetch error (rating per order): {e}")
+
+    # The pool is sized to the V2 ceiling, but only order_workers() orders are in flight at a time;
+    # that number follows the limiter, so a throttled API gets fewer orders instead of a queue of stalled ones
+    with ThreadPoolExecutor(max_workers=V2_MAX_CONCURRENCY) as executor:
+        queued = list(reversed(rows_to_rate))
+        in_flight = set()
+        while queued or in_flight:
+            while queued and len(in_flight) < order_workers():
+                in_flight.add(executor.submit(rate_order, queued.pop()))
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                res = future.result()
+                rate_results_map[res["order_no"]] = res
+                progress.advance()
+
+    # The sheets below are an export of the decision store, so fresh, reused and resumed orders are
+    # all written from the same stored records
+    try:
+        stored = decision_store.get_run_decisions(run_id)
+    except Exception as e:
+        print(f"Decision store error (exporting in-memory results): {e}")
+        stored = {}
+    for order_no in rate_results_map:
+        if str(order_no) in stored:
+            rate_results_map[order_no] = stored[str(order_no)]["result"]
+        else:
+            print(f"Order {order_no} missing from the decision store; exporting its in-memory result")
 
     current_row = 3
     grand_total_savings = 0.0
     decision_logs = []
     all_parts_for_list = []
 
+    progress.start_stage(job_progress.WRITE_WORKBOOK, total=len(store_rows))
     for store_id in config.STORE_MAP:
         if store_id not in store_rows:
             continue
+        progress.advance()
 
         # Sorting Order # per Store
         def order_sort_key(row):
@@ -438,13 +576,18 @@ def write_grouped_excel(store_rows, output_file):
         store_name = get_store_name(store_id)
         
         ### CHANGE: New trackers to handle Sequence-by-Order and Store-specific merging
-        store_order_tracker = {}
         order_sequence_map = {}  
         next_seq_num = 1         
         
         ws.cell(row=current_row, column=1, value=store_name).font = store_font
         current_row += 1
 
+        # Every item is one row, so each order's start/end row (and its merges) is known before writing
+        store_order_tracker = {}
+        for offset, row in enumerate(rows):
+            span = store_order_tracker.setdefault(row.get("Order #"), {"start": current_row + offset})
+            span["end"] = current_row + offset
+
         for row in rows:
             order_no = row.get("Order #")
             sku_info = get_sku_info_from_dailyouttools(row.get("SKU"))
@@ -452,13 +595,7 @@ def write_grouped_excel(store_rows, output_file):
             # Get pre-fetched data from our parallel map
             res = rate_results_map.get(order_no,{})
 
-            # Track start/end rows for merging this specific order
-            if order_no not in store_order_tracker:
-                store_order_tracker[order_no] = {"start": current_row, "end": current_row}
-                is_first_row = True
-            else:
-                store_order_tracker[order_no]["end"] = current_row
-                is_first_row = False
+            is_first_row = store_order_tracker[order_no]["start"] == current_row
 
             # Get Shipping DB from DailyOutTools
             shippingDB_cost = 0.0
@@ -497,20 +634,20 @@ def write_grouped_excel(store_rows, output_file):
             if is_ebay_purchase:
                 ebay_cell = ws.cell(row=current_row, column=14, value="possibly ebay purchase")
                 ebay_cell.fill = yellow_fill
-                ebay_cell.font = Font(size=9, bold=True)
-                ebay_cell.alignment = Alignment(horizontal="left")
+                ebay_cell.font = ebay_font
+                ebay_cell.alignment = left_align
 
             # SKU column 15 (weight) and 16 (service)
             if sku_info:
                 sku_weight = sku_info.get("Weight", 0)
                 weight_cell = ws.cell(row=current_row, column=15, value=sku_weight)
                 weight_cell.font = base_font
-                weight_cell.alignment = Alignment(horizontal="center")
+                weight_cell.alignment = center_align
 
                 sku_service = res.get("log_entry", {}).get("Decision Type", "N/A")
                 service_cell = ws.cell(row=current_row, column=16, value=sku_service)
                 service_cell.font = base_font
-                service_cell.alignment = Alignment(horizontal="left")
+                service_cell.alignment = left_align
             
             ### CHANGE: Logic to ensure Sequence matches the Order #, not the Row count
             if order_no not in order_sequence_map:
@@ -541,8 +678,17 @@ def write_grouped_excel(store_rows, output_file):
 
             row.update({"Carrier": f_carrier, "Service": f_service, "Box": f_box})
 
+            customer_key = (
+                str(row.get("First Name", "")).strip().lower(),
+                str(row.get("Last Name", "")).strip().lower()
+            )
+
             # Write data to cells
             for col_idx, col_name in enumerate(HEADERS, start=1):
+
+                # Merged columns only keep the order's first row; the merge would discard anything else
+                if not is_first_row and col_idx in MERGED_COLUMNS:
+                    continue
                 
                 value = row.get(col_name)
 
@@ -577,49 +723,27 @@ def write_grouped_excel(store_rows, output_file):
                             value = f"{value} | {dim_str}".strip(" | ")
                     
                 cell = ws.cell(row=current_row, column=col_idx, value=value)
-                cell.font = base_font
-                cell.border = all_border
-
-                if col_name in ["Sequence", "Carrier", "Service", "Box", "Shipping Price", "Qty"]:
-                    cell.alignment = Alignment(horizontal="center")
-
-                if col_name in WRAP_COLUMNS:
-                    cell.alignment = Alignment(
-                        wrap_text=True,
-                        horizontal="left",
-                        vertical="center"
-                        )
-                    ws. row_dimensions[current_row].height = None
+                cell.style = COLUMN_STYLES[col_name]
 
                 if col_name == "Part#" and value in (None, "", "None"):
                     cell.fill = red_fill
 
-                customer_key = (
-                    str(row.get("First Name", "")).strip().lower(),
-                    str(row.get("Last Name", "")).strip().lower()
-                )
                 if col_name == "Order #" and customer_counter.get(customer_key, 0) > 1:
                     cell.fill = yellow_fill
 
                 if col_name == "Qty" and order_total_qty.get(order_no, 0) > 1:
                     cell.fill = blue_fill
 
-                if col_name == "Order #":
-                    cell.alignment = Alignment(horizontal="right")
-
             res_cell = ws.cell(row=current_row, column=13, value=decision_msg)
-            res_cell.font = base_font
-            res_cell.border = all_border
 
             if isinstance(decision_msg, (int,float)):
-                res_cell.alignment = Alignment(horizontal="center")
-                res_cell.number_format = '"$"#,##0.00'
+                res_cell.style = "daily_money"
                 if decision_msg > 0:
-                    res_cell.fill = PatternFill(start_color="C6EFCE", fill_type="solid")
+                    res_cell.fill = green_savings
                 elif decision_msg < 0:
-                    res_cell.fill = PatternFill(start_color="FFC7CE", fill_type="solid")
+                    res_cell.fill = red_savings
             else:
-                res_cell.alignment = Alignment(horizontal="left", vertical="center")
+                res_cell.style = "daily_note"
                 if any(err in str(decision_msg).upper() for err in ["ERROR", "MISSING", "NOT FOUND"]):
                      res_cell.fill = red_fill
 
@@ -630,46 +754,37 @@ def write_grouped_excel(store_rows, output_file):
         for o_no, info in store_order_tracker.items():
             s_row, e_row = info["start"], info["end"]
             if s_row < e_row:
-                # Merge Sequence (Col 1)
-                ws.merge_cells(start_row=s_row, end_row=e_row, start_column=1, end_column=1)
-                ws.cell(row=s_row, column=1).alignment = Alignment(vertical="center", horizontal="center")
-                
-                # Merge Order # (Col 2)
-                ws.merge_cells(start_row=s_row, end_row=e_row, start_column=2, end_column=2)
-                ws.cell(row=s_row, column=2).alignment = Alignment(vertical="center", horizontal="right")
-                
-                # Merge G through K (Cols 7-11: Carrier, Service, Box, Price, Attention)
-                for col_idx in range(7, 12):
+                # Sequence (Col 1), Order # (Col 2), G through K (Cols 7-11: Carrier, Service, Box, Price, Attention)
+                for col_idx in MERGED_COLUMNS:
                     ws.merge_cells(start_row=s_row, end_row=e_row, start_column=col_idx, end_column=col_idx)
-                    ws.cell(row=s_row, column=col_idx).alignment = Alignment(vertical="center", horizontal="center")
+                    ws.cell(row=s_row, column=col_idx).alignment = merged_right_align if col_idx == 2 else merged_center_align
 
         current_row += 1 # Blank row between stores
 
     # Grand Total Savings on last column after last platform
     current_row += 1 
-    ws.cell(row=current_row, column=12, value="GRAND TOTAL SAVINGS:").font = Font(bold=True, size=10)
+    ws.cell(row=current_row, column=12, value="GRAND TOTAL SAVINGS:").font = total_font
     total_cell = ws.cell(row=current_row, column=13, value=grand_total_savings)
-    total_cell.font = Font(bold=True, size=10)
-    total_cell.number_format = '"$"#,##0.00'
-    total_cell.fill = PatternFill(start_color="FFFF00", fill_type="solid")
+    total_cell.font = total_font
+    total_cell.number_format = MONEY_FORMAT
+    total_cell.fill = total_fill
 
     # CREATE DECISION LOG SHEET
     if "Decision Log" in wb.sheetnames:
         del wb["Decision Log"]
     
     log_ws = wb.create_sheet(title="Decision Log")
-    log_headers = ["Order #", "SKU", "Shipping DB Cost", "Winner", "Comparison", "Savings", "Decision", "SKU Pkg",
-                   "Delivery Time (Days)", "Arrival", "Fallback","LP","Weight","Dims","Shipping Cost","GP","Interchange", "Store Name","Shipping Status"]
+    log_headers = LOG_HEADERS
     log_ws.append(log_headers)
 
     for cell in log_ws[1]:
-        cell.font = Font(bold=True, color="FFFFFF")
+        cell.font = log_header_font
         cell.fill = black_fill
 
-    green_savings = PatternFill(start_color="C6EFCE", fill_type="solid") # Light Green
-    red_savings = PatternFill(start_color="FFC7CE", fill_type="solid")   # Light Red    
+    # Column widths are tracked while appending instead of re-scanning the sheet afterwards
+    col_widths = [len(str(h)) for h in log_headers]
 
-    for entry in decision_logs:
+    for curr_log_row, entry in enumerate(decision_logs, start=2):
         row_data = [
             entry["Order #"], entry["SKU"], entry["DB Cost"], 
             entry["Winner"], entry["Comparison"], entry["Savings"], entry["Decision Type"], 
@@ -677,14 +792,13 @@ def write_grouped_excel(store_rows, output_file):
             entry["Weight"], entry["Dims"], entry["Shipping Cost"], entry["GP"], entry["Interchange"], entry["Store Name"], entry["Shipping Status"]
         ]
         log_ws.append(row_data)
+        col_widths = [max(w, len(str(v))) for w, v in zip(col_widths, row_data)]
 
-        # Get the row we just added
-        curr_log_row = log_ws.max_row
         savings_cell = log_ws.cell(row=curr_log_row, column=5) # Column 5 is Savings
 
         # Apply Savings Highlighting
         if isinstance(entry["Savings"], (int, float)):
-            savings_cell.number_format = '"$"#,##0.00'
+            savings_cell.number_format = MONEY_FORMAT
             if entry["Savings"] > 0:
                 savings_cell.fill = green_savings
             elif entry["Savings"] < 0:
@@ -695,33 +809,84 @@ def write_grouped_excel(store_rows, output_file):
             log_ws.cell(row=curr_log_row, column=10).fill = red_fill
         
     # Adjust Column Widths for readability
-    for col in log_ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        log_ws.column_dimensions[column].width = max_length + 2
+    for col_idx, max_length in enumerate(col_widths, start=1):
+        log_ws.column_dimensions[get_column_letter(col_idx)].width = max_length + 2
 
     # List Algorithm
+    progress.start_stage(job_progress.BUILD_LIST)
     create_list_algorithm(wb, all_parts_for_list)
 
-    progress_status["percent"] = 100
-
     wb.save(output_file)
+    decision_store.finish_run(run_id, decision_store.RUN_COMPLETE)
+    return run_id
+
+def fetch_awaiting_orders(incremental=True):
+    """
+        Returns every awaiting_shipment order.
+
+        Incremental: once today's first sync has stored a snapshot, later calls only ask V1 for
+        orders modified since the last sync (minus SYNC_OVERLAP_MINUTES) and patch the snapshot:
+        changed awaiting orders are replaced, orders that left awaiting_shipment are dropped.
+        The first call of a day (or incremental=False) does a full fetch.
+        Sync times are kept with their UTC offset and converted to SHIPSTATION_TZ for the request;
+        older snapshots without an offset are read as this machine's local time.
+        Used: main.py
+    """
+    sync_started = datetime.now(SHIPSTATION_TZ)
+    synced_at, snapshot = decision_store.load_order_snapshot() if incremental else (None, [])
+    last_sync = datetime.fromisoformat(synced_at).astimezone(SHIPSTATION_TZ) if synced_at else None
+
+    if last_sync and last_sync.date() == sync_started.date():
+        since = (last_sync - timedelta(minutes=SYNC_OVERLAP_MINUTES)).strftime("%Y-%m-%d %H:%M:%S")
+        orders_by_id = {o.get("orderId"): o for o in snapshot}
+        changed = get_shipments(modify_date_start=since)
+        for order in changed:
+            if order.get("orderStatus") == "awaiting_shipment":
+                orders_by_id[order.get("orderId")] = order
+            else:
+                orders_by_id.pop(order.get("orderId"), None)
+        orders = list(orders_by_id.values())
+        print(f"Incremental sync: {len(changed)} orders changed since {since}, {len(orders)} awaiting shipment")
+    else:
+        orders = get_shipments()
 
-def extract_todays_shipments():
+    try:
+        decision_store.save_order_snapshot(orders, sync_started.isoformat(timespec="seconds"))
+    except Exception as e:
+        print(f"Order snapshot error: {e}")
+    # Freshest count there is, so the index page doesn't need its own request for a while
+    set_awaiting_count(len(orders))
+    return orders
+
+def extract_todays_shipments(incremental=None, resume=False, progress=None):
     
     """
         Start of the entire program. Uses Shipstation V1 API to fetch all orders for the day,
         cleans up the SKU names and triggers the Excel writing process (write_grouped_excel).
+
+        incremental (default config INCREMENTAL_EXTRACT): fetch only the orders modified since the
+        last extract and re-rate only orders that are new or whose SKU/qty/ship-to changed; the
+        rest reuse today's stored decisions. The daily sheet is still rebuilt in full.
+        resume: continue today's interrupted run (see write_grouped_excel) instead of starting a new one.
+        progress: Progress to report stages into (the web job's); a private one is used otherwise.
     """
 
     start_time = time.perf_counter()
+    rate_cache.reset_stats()
+    if incremental is None:
+        incremental = INCREMENTAL_EXTRACT
 
-    orders = get_shipments()
+    progress = progress or Progress()
+    progress.plan(job_progress.EXTRACT_STAGES)
+    progress.start_stage(job_progress.FETCH_ORDERS)
+    orders = fetch_awaiting_orders(incremental)
+
+    # What each order's decision depends on, so unchanged orders can skip re-rating
+    catalog_version = tools_cache.signature()
+    fingerprints = {order["orderNumber"]: decision_store.order_fingerprint(order, catalog_version) for order in orders}
+
+    # Every rate call for this run reads addresses from here instead of re-fetching each order
+    cache_orders(orders)
 
     #test_orders = generate_test_orders(2)
     #orders.extend(test_orders)
@@ -780,7 +945,10 @@ def extract_todays_shipments():
     #output_file = f"output/orders_{today}.xlsx"
     output_file = config.main_file
 
-    write_grouped_excel(store_rows, output_file)
+    run_id = write_grouped_excel(store_rows, output_file, fingerprints=fingerprints, reuse=incremental, resume=resume, progress=progress)
+
+    # Make sure every temporary rating shipment is gone from ShipStation before reporting success
+    flush_cancellations()
 
     end_time = time.perf_counter()
     total_seconds = end_time - start_time
@@ -789,14 +957,21 @@ def extract_todays_shipments():
     
     duration = f"{minutes:02d}:{seconds:02d}"
 
+    cache_stats = rate_cache.stats()
+    print(f"Rate cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['hit_rate']}% hit rate)")
+
     return {
         "status": "success",
         "rows": len(store_rows),
         "file": output_file,
-        "duration": duration
+        "duration": duration,
+        "rate_cache": cache_stats,
+        "run_id": run_id
     }
 
-def run_debug_list_algorithm():
+def run_debug_list_algorithm(progress=None):
+    progress = progress or Progress()
+    progress.plan(job_progress.LIST_STAGES)
     filename = config.main_file
     today_day = str(datetime.today().day)
 
@@ -821,6 +996,7 @@ def run_debug_list_algorithm():
                 if str_val.lower() != "nan" and str_val != "":
                     parts_list.append(str_val)
         
+        progress.start_stage(job_progress.BUILD_LIST)
         create_list_algorithm(wb, parts_list)
         wb.save(filename)
         print(f"Success! Open {filename} to see the result.")
@@ -0,0 +1,116 @@
+import threading
+import time
+
+# Stage names shown in the UI
+FETCH_ORDERS = "fetch orders"
+RATE_SHOPPING = "rate shopping"
+WRITE_WORKBOOK = "write workbook"
+BUILD_LIST = "build list"
+LABELS = "labels"
+
+# (stage, weight) - weights are the rough share of a run's wall time, used for the overall percent
+EXTRACT_STAGES = [(FETCH_ORDERS, 10), (RATE_SHOPPING, 75), (WRITE_WORKBOOK, 10), (BUILD_LIST, 5)]
+LIST_STAGES = [(BUILD_LIST, 1)]
+LABEL_STAGES = [(LABELS, 1)]
+
+class Progress:
+    """
+        Progress of one job: which stage it's in, items done / total in that stage,
+        throughput and ETA. Workers update it; readers (the /jobs routes, the event stream)
+        take snapshots or block in wait() until it changes.
+    """
+
+    def __init__(self, stages=None):
+        self._cond = threading.Condition()
+        self.version = 0
+        self.finished = False
+        self.started_at = time.time()
+        self.plan(stages or [])
+
+    def plan(self, stages):
+        """Sets the ordered [(stage, weight), ...] this job will go through."""
+        with self._cond:
+            self._stages = list(stages)
+            self._stage = None
+            self._done = 0
+            self._base = 0
+            self._total = None
+            self._stage_started = time.time()
+            self._changed()
+
+    def start_stage(self, name, total=None, done=0):
+        """done: items already finished without work (e.g. reused results); not counted in throughput."""
+        with self._cond:
+            if name not in [s for s, _ in self._stages]:
+                self._stages.append((name, 1))
+            self._stage = name
+            self._done = done
+            self._base = done
+            self._total = total
+            self._stage_started = time.time()
+            self._changed()
+
+    def set_total(self, total):
+        with self._cond:
+            self._total = total
+            self._changed()
+
+    def advance(self, n=1):
+        with self._cond:
+            self._done += n
+            self._changed()
+
+    def finish(self):
+        with self._cond:
+            self.finished = True
+            self._changed()
+
+    def _changed(self):
+        # Caller holds _cond
+        self.version += 1
+        self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            now = time.time()
+            names = [s for s, _ in self._stages]
+            total_weight = sum(w for _, w in self._stages) or 1
+
+            if self._total:
+                stage_fraction = min(1.0, self._done / self._total)
+            else:
+                stage_fraction = 0.0
+
+            elapsed = now - self._stage_started
+            worked = self._done - self._base
+            rate = worked / elapsed if elapsed > 0 and worked > 0 else None
+            eta = (self._total - self._done) / rate if rate and self._total else None
+
+            if self.finished:
+                overall = 1.0
+            elif self._stage in names:
+                idx = names.index(self._stage)
+                overall = (sum(w for _, w in self._stages[:idx]) + self._stages[idx][1] * stage_fraction) / total_weight
+            else:
+                overall = 0.0
+
+            return {
+                "version": self.version,
+                "stage": self._stage,
+                "stages": names,
+                "stage_index": names.index(self._stage) if self._stage in names else None,
+                "done": self._done,
+                "total": self._total,
+                "stage_percent": int(stage_fraction * 100),
+                "percent": int(overall * 100),
+                "items_per_second": round(rate, 2) if rate else None,
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "elapsed_seconds": round(now - self.started_at, 1),
+                "finished": self.finished
+            }
+
+    def wait(self, version, timeout=None):
+        """Blocks until the progress moves past version (or timeout). Returns: snapshot()"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout=timeout)
+        return self.snapshot()
@@ -0,0 +1,67 @@
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
+
+LOG_SHEET = "Decision Log"
+
+LOG_HEADERS = ["Order #", "SKU", "Shipping DB Cost", "Winner", "Comparison", "Savings", "Decision", "SKU Pkg",
+               "Delivery Time (Days)", "Arrival", "Fallback","LP","Weight","Dims","Shipping Cost","GP","Interchange", "Store Name","Shipping Status"]
+
+STATUS_HEADER = "Shipping Status"
+
+# Unlabelled column right after the headers; the label run writes the actual cost there on a mismatch
+MISMATCH_COLUMN = len(LOG_HEADERS) + 1
+
+mismatch_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
+
+def read_decision_log(path, sheet_name=LOG_SHEET):
+    """
+        Streams the Decision Log in read-only/values_only mode and maps each row by header name,
+        so the label run doesn't depend on column positions or a full workbook load.
+
+        Returns: list of dicts {"row": excel row number, <header>: value, ...}, header row excluded
+        Used: shipping_ops.py
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = [(idx, name) for idx, name in enumerate(header) if name]
+
+        entries = []
+        for row_no, values in enumerate(rows, start=2):
+            entry = {"row": row_no}
+            for idx, name in columns:
+                entry[name] = values[idx] if idx < len(values) else None
+            entries.append(entry)
+        return entries
+    finally:
+        wb.close()
+
+def apply_log_updates(path, status_updates=None, cost_mismatches=None, sheet_name=LOG_SHEET):
+    """
+        Writes the label run's results back in one pass: status_updates {row: status} go into
+        the Shipping Status column, cost_mismatches {row: actual cost} into MISMATCH_COLUMN (red).
+        Nothing is loaded or saved when there's nothing to write.
+
+        Used: shipping_ops.py
+    """
+    status_updates = status_updates or {}
+    cost_mismatches = cost_mismatches or {}
+    if not status_updates and not cost_mismatches:
+        return
+
+    wb = load_workbook(path)
+    ws = wb[sheet_name]
+
+    header = [cell.value for cell in ws[1]]
+    status_col = header.index(STATUS_HEADER) + 1 if STATUS_HEADER in header else LOG_HEADERS.index(STATUS_HEADER) + 1
+
+    for row_no, status in status_updates.items():
+        ws.cell(row=row_no, column=status_col).value = status
+
+    for row_no, actual_cost in cost_mismatches.items():
+        cell = ws.cell(row=row_no, column=MISMATCH_COLUMN)
+        cell.value = actual_cost
+        cell.fill = mismatch_fill
+
+    wb.save(path)
@@ -0,0 +1,368 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+import config
+
+# Local SQLite copy of every fetch_order_data result; the Excel Decision Log is an export of this
+STORE_PATH = getattr(config, "DECISION_STORE_PATH", "data/decisions.sqlite")
+
+STATUS_PRICED = "priced"
+STATUS_SHIPPED = "SHIPPED"
+
+# A run stays "running" until its workbook is saved, so a crashed run can be found and resumed
+RUN_RUNNING = "running"
+RUN_COMPLETE = "complete"
+
+_lock = threading.Lock()
+_initialized = False
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(STORE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(STORE_PATH, timeout=30)
+    if not _initialized:
+        with _lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS runs (
+                        run_id TEXT PRIMARY KEY,
+                        run_date TEXT NOT NULL,
+                        started_at REAL NOT NULL,
+                        finished_at REAL,
+                        workbook TEXT,
+                        sheet TEXT,
+                        status TEXT NOT NULL
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS decisions (
+                        run_id TEXT NOT NULL,
+                        order_no TEXT NOT NULL,
+                        run_date TEXT NOT NULL,
+                        sku TEXT,
+                        decision_msg TEXT,
+                        best_rate_cost REAL,
+                        status TEXT NOT NULL,
+                        result_json TEXT NOT NULL,
+                        updated_at REAL NOT NULL,
+                        fingerprint TEXT,
+                        PRIMARY KEY (run_id, order_no)
+                    )
+                """)
+                # Stores created before incremental extraction have no fingerprint column yet
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(decisions)")}
+                if "fingerprint" not in columns:
+                    conn.execute("ALTER TABLE decisions ADD COLUMN fingerprint TEXT")
+                # Last known awaiting_shipment orders, kept current from modify-date deltas
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS order_snapshot (
+                        order_id TEXT PRIMARY KEY,
+                        order_json TEXT NOT NULL
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS sync_state (
+                        name TEXT PRIMARY KEY,
+                        value TEXT
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_decisions_order ON decisions (order_no, run_date)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_date ON runs (run_date, started_at)")
+                conn.commit()
+                _initialized = True
+    return conn
+
+def _json_default(value):
+    # numpy scalars from the DailyOutTools sheets, dates, tuples nested in sets...
+    if hasattr(value, "item"):
+        return _encode(value.item())
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, set):
+        return _encode(list(value))
+    return str(value)
+
+def _encode(value):
+    """
+        Copy of value that round-trips through strict JSON: NaN/inf floats (empty DailyOutTools cells)
+        become {"$float": "nan"} and tuples (the decision tuple, dims) {"$tuple": [...]}, so _decode
+        can give back exactly what fetch_order_data produced.
+    """
+    if isinstance(value, float):
+        return {"$float": repr(float(value))} if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return {"$tuple": [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    return value
+
+def _decode(value):
+    """Reverses _encode (rows stored before the tags existed decode as-is)."""
+    if isinstance(value, dict):
+        if value.keys() == {"$float"}:
+            return float(value["$float"])
+        if value.keys() == {"$tuple"}:
+            return tuple(_decode(v) for v in value["$tuple"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+def _json_safe(value):
+    """
+        Plain-JSON view of a decoded value for the web API: NaN/inf become None, tuples lists.
+        json.dumps would otherwise write bare NaN, which the API's JSON parsers reject.
+    """
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    return value
+
+def _dumps(value):
+    return json.dumps(_encode(value), default=_json_default, allow_nan=False)
+
+def _loads(text):
+    return _decode(json.loads(text))
+
+def start_run(workbook=None, sheet=None):
+    """Registers a new extract run. Returns: run_id"""
+    run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO runs (run_id, run_date, started_at, workbook, sheet, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, date.today().isoformat(), time.time(), workbook, sheet, RUN_RUNNING)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return run_id
+
+def finish_run(run_id, status=RUN_COMPLETE):
+    conn = _connect()
+    try:
+        conn.execute("UPDATE runs SET finished_at = ?, status = ? WHERE run_id = ?", (time.time(), status, run_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def order_fingerprint(order, catalog_version=None):
+    """
+        Hash of everything an order's decision depends on: items (SKU, qty), ship-to, store,
+        plus the DailyOutTools version, so a catalog edit re-prices the order too.
+    """
+    ship_to = order.get("shipTo") or {}
+    payload = {
+        "items": sorted((str(i.get("sku")).strip(), int(i.get("quantity", 1) or 1)) for i in order.get("items", [])),
+        "ship_to": [ship_to.get(k) for k in ("name", "street1", "street2", "city", "state", "postalCode", "country")],
+        "store": (order.get("advancedOptions") or {}).get("storeId"),
+        "catalog": catalog_version
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=_json_default).encode()).hexdigest()
+
+def is_reusable(result):
+    """
+        A stored result can stand in for a re-rate when it's a real decision: a priced winner,
+        or a deterministic rejection (catalog error / warehouse assistance). Rate fetch failures
+        are always retried.
+    """
+    if result.get("decision_msg") == "Rate Fetch Error":
+        return False
+    return bool(result.get("log_entry")) or bool(result.get("decision_msg"))
+
+def reusable_results(fingerprints, run_date=None):
+    """
+        Today's stored results whose inputs haven't changed.
+        fingerprints: {order_no: order_fingerprint(...)} for the orders being extracted
+        Returns: {order_no: result dict} from each order's latest matching run
+    """
+    run_date = str(run_date or date.today().isoformat())
+    conn = _connect()
+    try:
+        rows = conn.execute("""
+            SELECT order_no, fingerprint, result_json FROM decisions
+            WHERE run_date = ? ORDER BY updated_at
+        """, (run_date,)).fetchall()
+    finally:
+        conn.close()
+
+    # Later rows overwrite earlier ones, so each order ends up with its latest stored result
+    latest = {order_no: (fingerprint, result_json) for order_no, fingerprint, result_json in rows}
+    reusable = {}
+    for order_no, fingerprint in fingerprints.items():
+        stored = latest.get(str(order_no))
+        if stored and stored[0] == fingerprint:
+            result = _loads(stored[1])
+            if is_reusable(result):
+                reusable[order_no] = result
+    return reusable
+
+def save_results(run_id, entries):
+    """
+        Persists fetch_order_data results in one transaction (also used per order as a checkpoint).
+        entries: iterable of (order_no, sku, result, fingerprint) where result is the fetch_order_data dict
+        (decision tuple, log_entry with winner/comparison/dims/weight, excel_mapping, ...).
+    """
+    now = time.time()
+    run_date = date.today().isoformat()
+    rows = []
+    for order_no, sku, result, fingerprint in entries:
+        decision_msg = result.get("decision_msg")
+        rows.append((
+            run_id, str(order_no), run_date, sku,
+            None if decision_msg is None else str(decision_msg),
+            _json_safe(result.get("best_rate_cost")),
+            STATUS_PRICED,
+            _dumps(result),
+            now,
+            fingerprint
+        ))
+
+    conn = _connect()
+    try:
+        conn.executemany("""
+            INSERT OR REPLACE INTO decisions (run_id, order_no, run_date, sku, decision_msg, best_rate_cost, status, result_json, updated_at, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+def set_status(order_nos, status, run_id=None):
+    """Marks orders (in run_id, or in each order's latest run) e.g. SHIPPED after the label run."""
+    conn = _connect()
+    try:
+        for order_no in order_nos:
+            target_run = run_id or _latest_run_for(conn, order_no)
+            if target_run:
+                conn.execute(
+                    "UPDATE decisions SET status = ?, updated_at = ? WHERE run_id = ? AND order_no = ?",
+                    (status, time.time(), target_run, str(order_no))
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _latest_run_for(conn, order_no):
+    row = conn.execute(
+        "SELECT run_id FROM decisions WHERE order_no = ? ORDER BY run_date DESC, updated_at DESC LIMIT 1",
+        (str(order_no),)
+    ).fetchone()
+    return row[0] if row else None
+
+def _row_to_dict(row):
+    run_id, order_no, run_date, sku, decision_msg, best_rate_cost, status, result_json, updated_at = row
+    return {
+        "run_id": run_id,
+        "order_no": order_no,
+        "run_date": run_date,
+        "sku": sku,
+        "decision_msg": decision_msg,
+        "best_rate_cost": best_rate_cost,
+        "status": status,
+        "result": _loads(result_json),
+        "updated_at": updated_at
+    }
+
+def get_decision(order_no, run_id=None):
+    """
+        The stored decision for an order, from run_id or from its most recent run, as plain JSON
+        (NaN -> None, tuples -> lists) ready for jsonify.
+        Returns: dict (see _row_to_dict) or None
+        Used: app.py
+    """
+    conn = _connect()
+    try:
+        target_run = run_id or _latest_run_for(conn, order_no)
+        if not target_run:
+            return None
+        row = conn.execute(
+            "SELECT run_id, order_no, run_date, sku, decision_msg, best_rate_cost, status, result_json, updated_at "
+            "FROM decisions WHERE run_id = ? AND order_no = ?",
+            (target_run, str(order_no))
+        ).fetchone()
+    finally:
+        conn.close()
+    return _json_safe(_row_to_dict(row)) if row else None
+
+def get_run_decisions(run_id):
+    """
+        Every stored decision of one run, keyed by order number, with each result exactly as
+        fetch_order_data returned it (decision tuples, NaN cells). The workbook is exported from this.
+    """
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT run_id, order_no, run_date, sku, decision_msg, best_rate_cost, status, result_json, updated_at "
+            "FROM decisions WHERE run_id = ?",
+            (run_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row[1]: _row_to_dict(row) for row in rows}
+
+def latest_run(run_date=None, status=None):
+    """Most recent run (optionally for a date / with a status) as a dict, or None."""
+    query = "SELECT run_id, run_date, started_at, finished_at, workbook, sheet, status FROM runs"
+    clauses, params = [], []
+    if run_date:
+        clauses.append("run_date = ?")
+        params.append(str(run_date))
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY started_at DESC LIMIT 1"
+
+    conn = _connect()
+    try:
+        row = conn.execute(query, params).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    keys = ["run_id", "run_date", "started_at", "finished_at", "workbook", "sheet", "status"]
+    return dict(zip(keys, row))
+
+def load_order_snapshot():
+    """
+        Returns: (synced_at, orders) - the awaiting_shipment orders as of the last sync and the
+        time that sync started (ISO 8601 with UTC offset), or (None, []) before the first sync
+    """
+    conn = _connect()
+    try:
+        state = conn.execute("SELECT value FROM sync_state WHERE name = 'orders_synced_at'").fetchone()
+        rows = conn.execute("SELECT order_json FROM order_snapshot").fetchall()
+    finally:
+        conn.close()
+    if not state:
+        return None, []
+    return state[0], [_loads(r[0]) for r in rows]
+
+def save_order_snapshot(orders, synced_at):
+    """Replaces the snapshot with orders (as of synced_at) in one transaction."""
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM order_snapshot")
+        conn.executemany(
+            "INSERT OR REPLACE INTO order_snapshot (order_id, order_json) VALUES (?, ?)",
+            [(str(o.get("orderId")), _dumps(o)) for o in orders]
+        )
+        conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('orders_synced_at', ?)", (synced_at,))
+        conn.commit()
+    finally:
+        conn.close()
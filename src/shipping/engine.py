@@ -1,18 +1,17 @@
 import pandas as pd
 import re
+import threading
 import config
+from src.lookup.sku_index import get_sku, get_index
 
-SKU_DB = pd.read_excel("data/DailyOutTools.xlsx", sheet_name=None)
+# {SKU: decision} for the whole catalog, rebuilt whenever the SKU index is rebuilt
+_decision_table = None
+_decision_index = None
+_decision_lock = threading.Lock()
 
 def get_sku_info_from_dailyouttools(sku):
-    """Lookup SKU specs from DailyOutTools.xlsx(Sheet: DB or Nonmount)"""
-    for sheet in ["DB","Nonmounts"]:
-        df = SKU_DB.get(sheet)
-        if df is not None:
-            match = df[df['SKU'] == sku]
-            if not match.empty:
-                return match.iloc[0].to_dict()
-    return None
+    """Lookup SKU specs from DailyOutTools.xlsx(Sheet: DB or Nonmount) via the shared SKU index"""
+    return get_sku(sku)
 
 def parse_dims(dim_string):
     """Rule 5: Parse LxWxH format."""
@@ -44,15 +43,51 @@ def get_carrier_service(row_data):
 
     This method applies business rules (Weight, Flat Rate, Q-codes) to decide
     if an order can be shipped via a fixed service or if it needs to be sent to the 
-    shop_and_optimize method from optimizer.py for price optimization
+    shop_and_optimize method from optimizer.py for price optimization.
+    The rules only depend on the SKU's catalog row, so this reads the precomputed decision table.
 
     Returns: tuple: (Carrier, Service, PackageCode, Weight, Dimensions) OR ("ERROR", Message, None, 0)
     """
     current_sku = row_data.get('SKU','UNKNOWN')
-    sku_info = get_sku_info_from_dailyouttools(row_data['SKU'])
-    if not sku_info:
-        return "ERROR", f"SKU {current_sku} NOT FOUND IN DB/NONMOUNT", None, 0
+    return classify_skus([current_sku])[current_sku]
+
+def classify_skus(skus):
+    """
+    Batch version of get_carrier_service: one decision per SKU, straight from the decision table.
+    SKUs missing from DB/Nonmounts get their "NOT FOUND" error here, so callers can reject
+    those orders before scheduling any thread or HTTP work.
+
+    Returns: {SKU: decision tuple (or None when no rule matched)}
+    """
+    table = _get_decision_table()
+    decisions = {}
+    for sku in skus:
+        key = str(sku).strip() if sku is not None else None
+        if key in table:
+            decisions[sku] = table[key]
+        else:
+            decisions[sku] = ("ERROR", f"SKU {sku} NOT FOUND IN DB/NONMOUNT", None, 0)
+    return decisions
+
+def _get_decision_table():
+    """Applies _decide to every catalog SKU once per SKU index build."""
+    global _decision_table, _decision_index
+    index = get_index()
+    if _decision_index is not index:
+        with _decision_lock:
+            if _decision_index is not index:
+                table = {}
+                for sku, sku_info in index.items():
+                    try:
+                        table[sku] = _decide(sku, sku_info)
+                    except Exception as e:
+                        print(f"Decision table error for {sku}: {e}")
+                        table[sku] = None
+                _decision_table, _decision_index = table, index
+    return _decision_table
 
+def _decide(current_sku, sku_info):
+    """The carrier/service rules for one catalog row (see get_carrier_service)."""
     try:
         # Get weight, default to 16 if missing or NaN
         raw_w = sku_info.get("Weight")
@@ -1,19 +1,34 @@
-from src.shipstation.rates import get_live_rates
+from src.shipstation.rates import get_live_rates, get_live_rates_batch, quote_source, RATING_STRATEGY, STRATEGY_SHIPMENT, STRATEGY_VERIFY, FLAT_RATE_CODES, winner_strategy
 from datetime import datetime, timedelta,date
+import copy
 import pandas as pd
 from src.shipping.engine import parse_dims
+from src.shipstation import rate_card
 import config
 
-def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_id=None, is_residential=False):
+def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_id=None, is_residential=None, order_info=None, prefetched=None):
 
     """
         Optimization Engine: Compares multiple carriers and packaging options
 
         This method performs a competitive 'rate shop' by:
         1. Calculating the 'Must Arrive By' date based on store's handling rules
-        2. Testing different dimension sets (Primary, Alt, UPS Dims) against multiple carriers
+        2. Testing different dimension sets (Primary, Alt, UPS Dims) against multiple carriers,
+           built as one quote plan (quote_plan) and run concurrently through get_live_rates_batch
         3. Filtering for delivery speed (via process_and_validate)
         4. Selecting the lowest-cost winner or falling back to Priority Mail if Ground is too slow.
+        5. Under the "verify" rating strategy, re-quoting only the winner via create -> rate -> cancel
+           (see verify_winner), so the estimate endpoint does the bulk of the shopping.
+
+        Plan entries the offline rate card can answer confidently never hit the API. A card price
+        is never shipped on: if it wins, it's confirmed with one live quote first.
+
+        order_info is the cached {"order_id", "ship_to"} for the order; it's handed to every
+        get_live_rates call so the order is never re-fetched from V1 per quote.
+        is_residential: None when unknown (UPS is shopped and checked later); False when the
+        address is already known to be commercial, which skips the UPS quotes entirely.
+        prefetched: this order's plan results from prefetch_rates (the whole run rated in one batch);
+        when omitted the order's plan is rated on its own.
 
         Returns:
             dict: The 'Winner' rate obj containing cost, service, and comparison logs
@@ -25,60 +40,42 @@ def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_i
     days_offset = 7
     max_delivery_date = date.today() + timedelta(days=days_offset)
 
-    # Validate Weight Logic for non flat rates without SKU Weight
-    try:
-        if weight is None or pd.isna(weight) or float(weight) <= 0:
-            is_weight_invalid = True
-        else:
-            is_weight_invalid = False
-    except (TypeError, ValueError):
-        is_weight_invalid = True
+    built = quote_plan(order_no, weight, dims, to_state, to_zip, sku_info, is_residential, order_info)
+    if built is None:
+        return None
+    dim_sets, flat_codes, plan = built
 
-    if is_weight_invalid:
-        current_pkg = str(sku_info.get("Package","")).upper()
-        weight_independent_boxes = ["L", "M", "F", "P"]
+    results = prefetched if prefetched is not None else _rate_plans({order_no: plan})[order_no]
+    all_raw_rates = []
 
-        if current_pkg not in weight_independent_boxes:
-            print(f" [!] Order {order_no} BLOCK: Package '{current_pkg}' requires weight, but weight is {weight}. Skipping optimizer.")
-            return None
-    
-    # 1. Collect all dimension sets to test
-    dim_sets = [("Primary", dims, sku_info.get("Package"))]
-    
-    # Add ALT PACKAGE if it exists
-    alt_pkg = sku_info.get("ALT PACKAGE")
-    if alt_pkg and not pd.isna(alt_pkg):
-        alt_dims = parse_dims(alt_pkg)
-        if alt_dims and alt_dims != dims: # Only add if different from primary
-            dim_sets.append(("ALT", alt_dims, alt_pkg))
-            
-    # Add UPS DIMENSION if it exists
-    ups_dim_pkg = sku_info.get("UPS DIMENSION")
-    if ups_dim_pkg and not pd.isna(ups_dim_pkg):
-        ups_dims = parse_dims(ups_dim_pkg)
-        # Only add if different from primary and alt
-        if ups_dims and ups_dims != dims and (len(dim_sets) < 2 or ups_dims != dim_sets[1][1]):
-            dim_sets.append(("UPSD", ups_dims, ups_dim_pkg))
+    # Only the create -> rate -> cancel path reports residential status. With estimates it stays
+    # unknown, so UPS is shopped anyway and verify_winner confirms a UPS winner with a real shipment.
+    residential_known = RATING_STRATEGY == STRATEGY_SHIPMENT
 
-    all_raw_rates = []
+    # Remember which plan entry (and residential flag) each rate came from so a card price or a UPS
+    # price with an unknown address type can be confirmed live before it wins
+    for key, (rates, flag) in results.items():
+        for r in rates:
+            r["plan_key"] = key
+            r["is_residential"] = flag
 
-    checked_priority_codes = set()
+    # UPS was quoted alongside USPS instead of after it; discard it when either live quote detected
+    # a commercial address. A card answer's flag is None (unknown), so a UPS card price is kept here
+    # and verify_winner re-quotes it live before it can win.
+    if residential_known:
+        for label, _, _ in dim_sets:
+            flags = (results[(label, "usps")][1], results.get((label, "ups"), ([], None))[1])
+            if False in flags:
+                results.pop((label, "ups"), None)
 
-    # 2. Fetch rates for all dimension sets
-    for label, d, pkg_str in dim_sets:
-        print(f"--- Fetching rates for {label}: {d} ---")
-        usps, verified_res = get_live_rates(order_no, "usps", "usps_ground_advantage", "package", weight, d, to_state, to_zip, is_residential)
-        
-        # After running get_live_rates on usps, it'll update the is_residential so that we can use it for ups
-        is_residential = verified_res
-        ups = []
-        if is_residential and not (datetime.now().weekday() == 5 or (datetime.now().weekday() == 4 and datetime.now().hour >= 12)):
-            #ups = get_live_rates(order_no, "ups", "ups_ground_saver", "package", weight, d, to_state, to_zip, is_residential)
-            ups, _ = get_live_rates(order_no, "ups", None, "package", weight, d, to_state, to_zip, is_residential) # set it as none to get both ups_ground and ups_ground_saver
+    for idx, (label, d, pkg_str) in enumerate(dim_sets):
+        print(f"--- Rates for {label}: {d} ---")
+        usps = results[(label, "usps")][0]
+        ups = results.get((label, "ups"), ([], False))[0]
 
         print(f"{order_no} | [SHOP_AND_OPTIMIZE] DEBUG: UPS call returned {len(ups)} rates")
 
-        priority_std_raw, _ = get_live_rates(order_no, "usps", "usps_priority_mail", "package", weight, d, to_state, to_zip, is_residential)
+        priority_std_raw = results[(label, "priority")][0]
 
         priority_std = [
             r for r in priority_std_raw 
@@ -89,26 +86,21 @@ def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_i
         if priority_std:
             priority_std = [min(priority_std, key=lambda x: x.get("shipmentCost", 999))]
 
-        # Check Priority Mail
+        # Flat rates don't depend on dims, so they're only added alongside the first dim set
         priority_check = []
-        primary_pkg = [str(sku_info.get("Package","")).strip(), str(sku_info.get("ALT PACKAGE","")).strip()]
-        
-        for p_code in set(primary_pkg): # set() avoids duplicates
-            if p_code in config.pkg_map and p_code not in checked_priority_codes:
-                ss_code = config.pkg_map[p_code]
-                # Pass None for dims when using specific Flat Rate package codes
-                res, _ = get_live_rates(order_no, "usps", "usps_priority_mail", ss_code, weight, None, to_state, to_zip, is_residential)
-                filtered_res = [r for r in res if (r.get("packageType") or r.get("package_type")) == ss_code]
-                for fr_rate in filtered_res:
-                    fr_rate["dim_source"] = f"FLAT_{p_code}"
-                    fr_rate["winning_pkg_str"] = p_code 
-                    priority_check.append(fr_rate)
-                
-                checked_priority_codes.add(p_code)
+        for p_code in (flat_codes if idx == 0 else []):
+            ss_code = config.pkg_map[p_code]
+            res = results[("FLAT", p_code)][0]
+            filtered_res = [r for r in res if (r.get("packageType") or r.get("package_type")) == ss_code]
+            for fr_rate in filtered_res:
+                fr_rate["dim_source"] = f"FLAT_{p_code}"
+                fr_rate["winning_pkg_str"] = p_code 
+                priority_check.append(fr_rate)
 
         # Add the label to the rate object so we know where it came from
         for r in (usps + ups + priority_std):
             r["dim_source"] = label
+            r["quote_dims"] = d
 
             serviceCode = r.get("serviceCode")
 
@@ -131,9 +123,16 @@ def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_i
     valid_rates, comp_log = process_and_validate(valid_raw, max_delivery_date)
 
     # 4. FINAL DECISION
-    if valid_rates:
-        winner = min(valid_rates, key=lambda x: x["shipmentCost"])
+    if valid_rates and RATING_STRATEGY == STRATEGY_VERIFY:
+        winner = verify_winner(order_no, valid_rates, weight, to_state, to_zip, max_delivery_date, order_info)
+    elif valid_rates:
+        # Cheapest wins; if that's a rate card price, it's confirmed live first
+        winner = verify_winner(order_no, valid_rates, weight, to_state, to_zip, max_delivery_date, order_info,
+                               strategy=RATING_STRATEGY, card_only=True)
+    else:
+        winner = None
 
+    if winner:
         if " vs " not in comp_log:
             winner["comparison_log"] = f"{comp_log} ONLY"
         else:
@@ -144,7 +143,12 @@ def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_i
         # FINAL FALLBACK: PRIORITY MAIL
         print("  [!] No Ground options met date. Falling back to Priority Mail...")
         fallback_pkg = str(sku_info.get("Package","")).strip()
-        priority_raw, _ = get_live_rates(order_no, "usps", "usps_priority_mail", "package", weight, dims, to_state, to_zip, is_residential)
+        planned = results[(dim_sets[0][0], "priority")][0]
+        if winner_strategy() == RATING_STRATEGY and not any(r.get("rate_card") for r in planned):
+            # Same Priority package quote the plan already made for the primary dims; reuse it
+            priority_raw = copy.deepcopy(planned)
+        else:
+            priority_raw, _ = get_live_rates(order_no, "usps", "usps_priority_mail", "package", weight, dims, to_state, to_zip, is_residential, order_info=order_info, strategy=winner_strategy())
         priority = [
             r for r in priority_raw 
             if (r.get("packageType") or r.get("package_type")) in ["package", "parcel", None]
@@ -167,6 +171,176 @@ def shop_and_optimize(order_no,weight, dims, to_state, to_zip, sku_info, store_i
             return winner
         return None
 
+def quote_plan(order_no, weight, dims, to_state, to_zip, sku_info, is_residential=None, order_info=None):
+    """
+        Builds the quotes shop_and_optimize needs for one order, without calling any API.
+
+        Returns: (dim_sets, flat_codes, plan) where plan is {(dim label or "FLAT", carrier/code): get_live_rates kwargs},
+                 or None when the order can't be shopped (a weight-priced package with no weight)
+    """
+    # Validate Weight Logic for non flat rates without SKU Weight
+    try:
+        if weight is None or pd.isna(weight) or float(weight) <= 0:
+            is_weight_invalid = True
+        else:
+            is_weight_invalid = False
+    except (TypeError, ValueError):
+        is_weight_invalid = True
+
+    if is_weight_invalid:
+        current_pkg = str(sku_info.get("Package","")).upper()
+        weight_independent_boxes = ["L", "M", "F", "P"]
+
+        if current_pkg not in weight_independent_boxes:
+            print(f" [!] Order {order_no} BLOCK: Package '{current_pkg}' requires weight, but weight is {weight}. Skipping optimizer.")
+            return None
+    
+    # 1. Collect all dimension sets to test
+    dim_sets = [("Primary", dims, sku_info.get("Package"))]
+    
+    # Add ALT PACKAGE if it exists
+    alt_pkg = sku_info.get("ALT PACKAGE")
+    if alt_pkg and not pd.isna(alt_pkg):
+        alt_dims = parse_dims(alt_pkg)
+        if alt_dims and alt_dims != dims: # Only add if different from primary
+            dim_sets.append(("ALT", alt_dims, alt_pkg))
+            
+    # Add UPS DIMENSION if it exists
+    ups_dim_pkg = sku_info.get("UPS DIMENSION")
+    if ups_dim_pkg and not pd.isna(ups_dim_pkg):
+        ups_dims = parse_dims(ups_dim_pkg)
+        # Only add if different from primary and alt
+        if ups_dims and ups_dims != dims and (len(dim_sets) < 2 or ups_dims != dim_sets[1][1]):
+            dim_sets.append(("UPSD", ups_dims, ups_dim_pkg))
+
+    ups_cutoff = datetime.now().weekday() == 5 or (datetime.now().weekday() == 4 and datetime.now().hour >= 12)
+
+    def quote(carrier, service, pkg, d, residential):
+        return {"order_no": order_no, "carrier": carrier, "service": service, "pkg": pkg, "weight": weight, "dims": d,
+                "to_state": to_state, "to_zip": to_zip, "is_residential": residential, "order_info": order_info}
+
+    # 2. Build the whole quote plan up front so it can go out concurrently instead of one call at a time
+    plan = {}
+    for label, d, pkg_str in dim_sets:
+        plan[(label, "usps")] = quote("usps", "usps_ground_advantage", "package", d, is_residential)
+        plan[(label, "priority")] = quote("usps", "usps_priority_mail", "package", d, is_residential)
+        # A known-commercial address never ships UPS, so don't pay for the quote
+        if not ups_cutoff and is_residential is not False:
+            # set service as None to get both ups_ground and ups_ground_saver
+            plan[(label, "ups")] = quote("ups", None, "package", d, is_residential)
+
+    # Check Priority Mail flat rates once per code; pass None for dims when using specific Flat Rate package codes
+    primary_pkg = [str(sku_info.get("Package","")).strip(), str(sku_info.get("ALT PACKAGE","")).strip()]
+    flat_codes = [p_code for p_code in set(primary_pkg) if p_code in config.pkg_map] # set() avoids duplicates
+    for p_code in flat_codes:
+        plan[("FLAT", p_code)] = quote("usps", "usps_priority_mail", config.pkg_map[p_code], None, is_residential)
+
+    return dim_sets, flat_codes, plan
+
+def _rate_plans(plans):
+    """
+        Prices many orders' quote plans together: {order_no: plan} -> {order_no: {plan key: (rates, is_residential)}}.
+        Rate card answers first, then every remaining quote of every order in one get_live_rates_batch.
+    """
+    live = []
+    results = {order_no: {} for order_no in plans}
+    for order_no, plan in plans.items():
+        for key, q in plan.items():
+            # Answer what we can from the rate card; only unknown/unsettled cells go to the API.
+            # Residential status is unknown for card answers (None)
+            card = rate_card.lookup(**q, source=quote_source(q["pkg"]))
+            if card:
+                results[order_no][key] = (card, None)
+            else:
+                live.append((order_no, key, q))
+
+    # Every live quote runs concurrently, so the batch costs as much as its slowest shipment chunk
+    for (order_no, key, _), res in zip(live, get_live_rates_batch([q for _, _, q in live])):
+        results[order_no][key] = res
+    return results
+
+def prefetch_rates(orders):
+    """
+        Rates the whole run's shop plans in one batch before any order is optimized, so temporary
+        shipments are shared across orders (one per address + package shape) instead of per order.
+
+        :param orders: list of shop_and_optimize keyword dicts (order_no, weight, dims, to_state, to_zip,
+                       sku_info, is_residential, order_info; store_id is ignored)
+        Returns: {order_no: results} to hand to shop_and_optimize(prefetched=...)
+        Used: main.py (write_grouped_excel)
+    """
+    plans = {}
+    for o in orders:
+        built = quote_plan(o["order_no"], o["weight"], o["dims"], o["to_state"], o["to_zip"], o["sku_info"],
+                           o.get("is_residential"), o.get("order_info"))
+        if built is not None:
+            plans[o["order_no"]] = built[2]
+    return _rate_plans(plans)
+
+def verify_winner(order_no, candidates, weight, to_state, to_zip, max_date, order_info=None, strategy=STRATEGY_SHIPMENT, card_only=False):
+    """
+        Estimate-then-verify: walks the candidates cheapest first and re-quotes each one through
+        the full create -> rate -> cancel path until one holds up. A candidate is dropped when the
+        live quote comes back empty, arrives after max_date, or is UPS to a commercial address
+        (UPS is only used for residential deliveries). Flat rates are always priced by estimate
+        so they're accepted as-is, unless the price came from the rate card.
+
+        card_only=True re-quotes only rate card prices (with the given strategy) and accepts
+        live-quoted candidates as they are.
+        A UPS candidate whose address isn't known to be residential (estimate or card prices) is
+        always re-quoted through create -> rate -> cancel, whatever the strategy, so UPS can't win
+        for a business address.
+
+        Returns: the candidate rate updated with its live cost/arrival, or None
+    """
+    # ups_ground and ups_ground_saver come from the same UPS quote, so they share one live re-quote
+    live_quotes = {}
+
+    for cand in sorted(candidates, key=lambda x: x["shipmentCost"]):
+        is_flat = cand.get("packageType") in FLAT_RATE_CODES
+        carrier = "ups" if "ups" in str(cand.get("carrierCode")).lower() else "usps"
+        ups_unconfirmed = carrier == "ups" and cand.get("is_residential") is not True
+        if (is_flat or card_only) and not cand.get("rate_card") and not ups_unconfirmed:
+            return cand
+
+        service = None if carrier == "ups" else cand.get("serviceCode")
+        pkg = cand.get("packageType") if is_flat else "package"
+        dims = None if is_flat else cand.get("quote_dims")
+        memo_key = (carrier, service, pkg, tuple(dims or ()))
+        if memo_key not in live_quotes:
+            live_quotes[memo_key] = get_live_rates(
+                order_no, carrier, service, pkg, weight, dims,
+                to_state, to_zip, False, order_info=order_info,
+                strategy=STRATEGY_SHIPMENT if carrier == "ups" else strategy
+            )
+        live, live_residential = live_quotes[memo_key]
+        live = [r for r in live if r.get("serviceCode") == cand.get("serviceCode")
+                and (not is_flat or (r.get("packageType") or r.get("package_type")) == pkg)]
+
+        # UPS is always re-quoted through create -> rate -> cancel, which knows whether the address is residential
+        if carrier == "ups" and not live_residential:
+            print(f"  [VERIFY] {order_no}: UPS dropped, address is commercial")
+            continue
+        if not live:
+            print(f"  [VERIFY] {order_no}: no live rate for {cand.get('serviceCode')}")
+            continue
+
+        match = min(live, key=lambda x: x.get("shipmentCost", 999))
+        delivery_str = match.get("estimated_delivery_date")
+        if delivery_str and date.fromisoformat(delivery_str[:10]) > max_date:
+            print(f"  [VERIFY] {order_no}: {cand.get('serviceCode')} arrives too late once verified")
+            continue
+
+        if abs(match["shipmentCost"] - cand["shipmentCost"]) > 0.01:
+            print(f"  [VERIFY] {order_no}: estimate ${cand['shipmentCost']} -> live ${match['shipmentCost']}")
+        cand["shipmentCost"] = match["shipmentCost"]
+        cand["estimated_delivery_date"] = delivery_str or cand.get("estimated_delivery_date")
+        cand["verified"] = True
+        cand.pop("rate_card", None)
+        return cand
+
+    return None
+
 def process_and_validate(rates_list, max_date):
     """Helper to calculate costs and return valid rates + the comparison string."""
     valid = []
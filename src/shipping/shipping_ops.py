@@ -6,24 +6,31 @@ from reportlab.platypus import Paragraph
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from PyPDF2 import PdfReader, PdfWriter, Transformation
-import requests
+from src.shipstation import session
 from datetime import datetime
 import config
-from openpyxl import load_workbook
 import math
-from openpyxl.styles import PatternFill
 from urllib.parse import quote
 import os
 import copy
 from src.shipstation.rates import V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET, V2_API_KEY
 import hashlib
-import json
-import src.main as main
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.progress import Progress, LABEL_STAGES, LABELS
+from src.shipping.decision_log import read_decision_log, apply_log_updates, STATUS_HEADER
+from src.shipping import decision_store
+from src.shipstation import rate_limit
+
+V1_BASE_URL = "https://ssapi.shipstation.com"
+
+# Label creation threads; the V1 rate limiter still decides how many calls are in flight
+LABEL_WORKERS = getattr(config, "LABEL_WORKERS", rate_limit.V1_MAX_CONCURRENCY)
 
 def get_v1_balance(carrier_code="stamps_com"):
     """Check actual balance via V1 Carriers list."""
     url = "https://ssapi.shipstation.com/carriers"
-    response = requests.get(url, auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET))
+    response = session.get(url, auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET))
     if response.status_code == 200:
         for c in response.json():
             if c.get("code") == carrier_code:
@@ -50,240 +57,306 @@ def merge_labels_to_pdf(metadata_list, output_filename="batch_labels.pdf"):
         writer.write(f)
     return output_filename
 
-def shipping_label_algo(sheet_name):
-    BASE_URL = "https://ssapi.shipstation.com"
-    SS_AUTH = (V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET)
+def find_order(order_no):
+    """
+        V1 lookup of one order by number.
+        Returns: the matching order dict, or None if ShipStation doesn't have it
+        Raises: RuntimeError when the lookup fails or returns a different order
+    """
+    order_response = session.get(
+        f"{V1_BASE_URL}/orders?orderNumber={quote(str(order_no))}",
+        auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET),
+        timeout=15
+    )
+
+    if order_response.status_code != 200:
+        raise RuntimeError(f"FAILED TO FETCH order {order_no}: {order_response.text}")
+
+    try:
+        orders = order_response.json().get("orders", [])
+    except Exception as e:
+        raise RuntimeError(f"FAILED TO PARSE JSON for {order_no}: {e}")
+
+    if not orders:
+        return None
+
+    for o in orders:
+        if str(o.get("orderNumber")).strip() == order_no:
+            return o
+    raise RuntimeError(f"CRITICAL: API search for {order_no} returned wrong order!")
+
+def build_label_payload(entry, order_id):
+    """
+        createlabelfororder payload for one Decision Log row.
+        Returns: (payload, sku_pkg as printed on the label page)
+    """
+    service_code = entry.get("Decision")
+    sku_pkg = entry.get("SKU Pkg")
+    weight_val = entry.get("Weight")
+
+    # if weight is missing for priority mail, add 1 lbs to it
+    if weight_val is None:
+        weight_val = 1.0
+
+    dims_str = str(entry.get("Dims"))
+
+    # Weight/Package Logic
+    if service_code == "usps_first_class_mail":
+        final_weight = float(weight_val)
+    else:
+        final_weight = math.ceil(float(weight_val))
+
+    package_code = "package"
+    if service_code == "usps_priority_mail":
+        package_code = config.pkg_map.get(sku_pkg, "package")
+    elif service_code == "usps_first_class_mail":
+        sku_pkg = "BAG"
 
+    # Dimensions Logic
+    dims = {"units": "inches", "length": 1, "width": 1, "height": 1}
+
+    if sku_pkg in config.DIM_MAP:
+        l, w, h = config.DIM_MAP[sku_pkg]
+        dims.update({"length": l, "width": w, "height": h})
+    else:
+        dim_source = None
+        if sku_pkg and 'x' in sku_pkg.lower():
+            dim_source = sku_pkg
+        elif dims_str and 'x' in dims_str.lower():
+            dim_source = dims_str
+
+        if dim_source:
+            try:
+                d_parts = dim_source.lower().split('x')
+                dims.update({
+                    "length": float(d_parts[0]),
+                    "width": float(d_parts[1]),
+                    "height": float(d_parts[2])
+                })
+            except (ValueError, IndexError):
+                dims.update({"length": 1, "width": 1, "height": 1})
+        else:
+            dims.update({"length": 1, "width": 1, "height": 1})
+
+    payload = {
+        "orderId": order_id,
+        "carrierCode": "stamps_com" if "usps" in service_code else "ups_walleted",
+        "serviceCode": service_code,
+        "packageCode": package_code,
+        "confirmation": "delivery",
+        "shipDate": datetime.now().strftime("%Y-%m-%d"),
+        "weight": {"value": float(final_weight), "units": "pounds"},
+        "dimensions": dims,
+        "testLabel": False
+    }
+    return payload, sku_pkg
+
+def void_labels(created_shipment_ids):
+    """
+        Voids every label in [{"shipment_id", "order_no"}, ...]; failures are reported, not raised.
+        Returns: the items that could not be voided (denied, HTTP error or no response)
+    """
+    failed = []
+    for item in created_shipment_ids:
+        s_id = item["shipment_id"]
+        o_no = item["order_no"]
+        try:
+            void_res = session.post(
+                f"{V1_BASE_URL}/shipments/voidlabel",
+                auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET),
+                json={"shipmentId": s_id},
+                timeout=10
+            )
+
+            if void_res.status_code == 200:
+                void_data = void_res.json()
+
+                if void_data.get("approved"):
+                    print(f" [SUCCESS] Voided Order: {o_no} (Shipment ID: {s_id})")
+                else:
+                    print(f"  [WARNING] ShipStation denied void for Order {o_no}: {void_data.get('message')}")
+                    failed.append(item)
+            else:
+                print(f"  [FAILED] HTTP {void_res.status_code} for Order {o_no} - {void_res.text}")
+                failed.append(item)
+
+        except Exception as void_err:
+            print(f"Could not void Order {o_no} (ID: {s_id}): {void_err}")
+            failed.append(item)
+    return failed
+
+def shipping_label_algo(sheet_name, progress=None):
+    """
+        Creates a label for every unshipped Decision Log row and merges them into one PDF.
+
+        1. Look up the orders (concurrently, read-only).
+        2. Reserve each label's expected cost against the wallet, serially in Decision Log order;
+           a short wallet stops the batch before anything is bought.
+        3. Create the labels on LABEL_WORKERS threads (the V1 limiter paces the calls).
+           The first failure stops labels that haven't started yet.
+        4. Check every label in Decision Log order. If anything failed, every label created in
+           this batch is voided and nothing is marked SHIPPED. Otherwise the PDF is merged in
+           Decision Log order.
+
+        Returns: merged PDF path, or False when the batch failed
+        Used: app.py
+    """
     ship_balance = get_v1_balance("stamps_com")
 
-    wb = load_workbook(config.main_file)
-    ws = wb[sheet_name]
+    # Read-only, header-indexed pass over the log; results are written back once at the end
+    log_rows = read_decision_log(config.main_file, sheet_name)
+    pending = [entry for entry in log_rows if entry.get("Order #") and entry.get(STATUS_HEADER) != "SHIPPED"]
 
     order_metadata_list = []
     seen_base64_hashes = {}
     created_shipment_ids = []
-    session_affected_rows = [] # Track only rows handled in THIS run
+    created_lock = threading.Lock()
+    manual_void = [] # orders whose label may still exist after the batch failed: no shipment id, or the void failed
+    shipped_rows = {} # {row: "SHIPPED"} for rows handled in THIS run, only saved if the batch succeeds
+    cost_mismatches = {}
     batch_failed = False
+    stop = threading.Event()
 
-    # For the progress bar
-    main.progress_status['percent'] = 0
-    total_rows = ws.max_row - 1
-    processed_count = 0
-
-    try:
-        # iterate through rows after header
-        for row in range(2, ws.max_row + 1):
-            processed_count += 1
-            main.progress_status['percent'] = int((processed_count / total_rows) * 100)
-            
-            # Variable Reset to prevent shipping label mix
-            label_json = None
-            shipment_id = None
-            customer_name = "N/A"
-            cust_address = "N/A"
-
-            order_no = ws.cell(row=row, column=1).value
-            if not order_no or ws.cell(row=row, column=19).value == "SHIPPED":
-                processed_count += 1
-                main.progress_status['percent'] = int((processed_count / total_rows) * 100)
-                continue
+    # For the progress bar (the job's Progress when run from the web app)
+    progress = progress or Progress()
+    progress.plan(LABEL_STAGES)
+    progress.start_stage(LABELS, total=len(pending))
 
-            print(f"Processing Order: {order_no}")
+    def create_label(job):
+        if stop.is_set():
+            return None
+        order_no = job["entry"].get("Order #")
+        print(f"Creating label: {order_no} ({job['payload']['serviceCode']}, {job['payload']['packageCode']})")
 
-            # Fetch Order from API
-            order_response = requests.get(
-                f"{BASE_URL}/orders?orderNumber={quote(str(order_no))}", 
-                auth=SS_AUTH, 
-                timeout=15
-            )
-
-            if order_response.status_code != 200:
-                print(f"FAILED TO FETCH order {order_no}: {order_response.text}")
-                batch_failed = True
-                break
+        try:
+            try:
+                res = session.post(
+                    f"{V1_BASE_URL}/orders/createlabelfororder",
+                    auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET),
+                    json=job["payload"],
+                    timeout=30
+                )
+            except Exception:
+                # A timeout/dropped connection can still have bought the label on ShipStation's side
+                with created_lock:
+                    manual_void.append(order_no)
+                raise
+            if res.status_code != 200:
+                raise RuntimeError(f"API Error for {order_no}: {res.text}")
 
             try:
-                order_data = order_response.json()
-                orders = order_data.get("orders", [])
+                label_json = res.json()
+                shipment_id = label_json["shipmentId"]
             except Exception as e:
-                print(f"FAILED TO PARSE JSON for {order_no}: {e}")
-                batch_failed = True
-                break
+                # 200 means the label exists, but we can't tell which shipment to void
+                with created_lock:
+                    manual_void.append(order_no)
+                raise RuntimeError(f"Unreadable label response for {order_no}: {e}")
+
+            # Recorded before anything else can go wrong, so a failed batch always voids it
+            with created_lock:
+                created_shipment_ids.append({"shipment_id": shipment_id, "order_no": order_no})
+            if abs(float(label_json.get("shipmentCost", 0)) - job["expected_cost"]) > 0.01:
+                # The batch will be voided, so don't buy any more labels
+                stop.set()
+        except BaseException:
+            # Any failure voids the whole batch, so stop buying labels right away
+            stop.set()
+            raise
+        progress.advance()
+        return label_json
 
-            if not orders:
+    try:
+        # 1. Order lookups
+        with ThreadPoolExecutor(max_workers=LABEL_WORKERS) as executor:
+            found = list(executor.map(lambda entry: find_order(entry.get("Order #")), pending))
+
+        # 2. Wallet reservation, in Decision Log order
+        label_jobs = []
+        for entry, matched_order in zip(pending, found):
+            order_no = entry.get("Order #")
+            if not matched_order:
                 print(f"Order {order_no} not found in ShipStation.")
+                progress.advance()
                 continue
-                
-            matched_order = None
-            for o in orders:
-                if str(o.get("orderNumber")).strip() == order_no:
-                    matched_order = o
-                    break
-            
-            if not matched_order:
-                print(f"CRITICAL: API search for {order_no} returned wrong order!")
-                batch_failed = True
-                break
-
-            order_id = matched_order["orderId"]
-            ship_to = matched_order.get("shipTo", {})
-            customer_name = ship_to.get("name", "N/A")
-            cust_address = f"{ship_to.get('street1')}\n{ship_to.get('city')}, {ship_to.get('state')} {ship_to.get('postalCode')}"
-
-            # --- Data Collection ---
-            service_code = ws.cell(row=row, column=7).value
-            sku_pkg = ws.cell(row=row, column=8).value
-            weight_val = ws.cell(row=row, column=13).value
-
-            # if weight is missing for priority mail, add 1 lbs to it
-            if weight_val is None:
-                weight_val = 1.0
-
-            dims_str = str(ws.cell(row=row, column=14).value)
-            expected_cost = float(ws.cell(row=row, column=15).value)
 
-            # Wallet Check
+            expected_cost = float(entry.get("Shipping Cost"))
             if expected_cost > ship_balance:
                 print("INSUFFICIENT FUNDS. BUY AND RUN AGAIN. NO ORDERS WERE SHIPPED OR VOIDED")
-                batch_failed = True
-                break
-
+                raise RuntimeError("Insufficient funds")
             ship_balance -= expected_cost
 
-            # Weight/Package Logic
-            if service_code == "usps_first_class_mail":
-                final_weight = float(weight_val)
-            else:
-                final_weight = math.ceil(float(weight_val))
-
-            package_code = "package"
-            if service_code == "usps_priority_mail":
-                package_code = config.pkg_map.get(sku_pkg, "package")
-            elif service_code == "usps_first_class_mail":
-                sku_pkg = "BAG"
+            payload, sku_pkg = build_label_payload(entry, matched_order["orderId"])
+            label_jobs.append({
+                "entry": entry,
+                "order": matched_order,
+                "expected_cost": expected_cost,
+                "payload": payload,
+                "sku_pkg": sku_pkg
+            })
+
+        # 3. Label creation
+        with ThreadPoolExecutor(max_workers=LABEL_WORKERS) as executor:
+            futures = [executor.submit(create_label, job) for job in label_jobs]
+
+        # 4. Results in Decision Log order
+        for job, future in zip(label_jobs, futures):
+            entry = job["entry"]
+            row = entry["row"]
+            order_no = entry.get("Order #")
+
+            label_json = future.result()
+            if label_json is None:
+                # Skipped after an earlier failure; that failure is raised from its own future
+                batch_failed = True
+                continue
 
-            # Dimensions Logic
-            dims = {"units": "inches", "length": 1, "width": 1, "height": 1}
+            b64_data = label_json.get("labelData")
+            actual_cost = float(label_json.get("shipmentCost", 0))
 
-            if sku_pkg in config.DIM_MAP:
-                l, w, h = config.DIM_MAP[sku_pkg]
-                dims.update({"length": l, "width": w, "height": h})
+            # --- DEBUGGING BLCOK : CHECK FOR DUPLICATE BASE64 ---
+            label_hash = hashlib.md5(b64_data.encode()).hexdigest()
+            if label_hash in seen_base64_hashes:
+                prev_order = seen_base64_hashes[label_hash]
+                print(f"!!! ALERT: DUPLICATE BASE64 DETECTED !!!")
+                print(f"Order {order_no} (Row {row}) got same label as Order {prev_order}")
             else:
-                dim_source = None
-                if sku_pkg and 'x' in sku_pkg.lower():
-                    dim_source = sku_pkg
-                elif dims_str and 'x' in dims_str.lower():
-                    dim_source = dims_str
-
-                if dim_source:
-                    try:
-                        d_parts = dim_source.lower().split('x')
-                        dims.update({
-                            "length": float(d_parts[0]),
-                            "width": float(d_parts[1]),
-                            "height": float(d_parts[2])
-                        })
-                    except (ValueError, IndexError):
-                        dims.update({"length": 1, "width": 1, "height": 1})
-                else:
-                    dims.update({"length": 1, "width": 1, "height": 1})
-
-            payload = {
-                "orderId": order_id,
-                "carrierCode": "stamps_com" if "usps" in service_code else "ups_walleted",
-                "serviceCode": service_code,
-                "packageCode": package_code,
-                "confirmation": "delivery",
-                "shipDate": datetime.now().strftime("%Y-%m-%d"),
-                "weight": {"value": float(final_weight), "units": "pounds"},
-                "dimensions": dims,
-                "testLabel": False
-            }
-
-            print(f"--- PAYLOAD FOR {order_no} ---")
-            print(json.dumps(payload, indent=4)) 
-            print("----------------------------")
-
-            # Create Label Request with timeout
-            res = requests.post(f"{BASE_URL}/orders/createlabelfororder", auth=SS_AUTH, json=payload, timeout=30)
-
-            if res.status_code == 200:
-                label_json = res.json()
-                b64_data = label_json.get("labelData")
-                actual_cost = float(label_json.get("shipmentCost", 0))
-                shipment_id = label_json.get("shipmentId")
-
-                # --- DEBUGGING BLCOK : CHECK FOR DUPLICATE BASE64 ---
-                label_hash = hashlib.md5(b64_data.encode()).hexdigest()
-                if label_hash in seen_base64_hashes:
-                    prev_order = seen_base64_hashes[label_hash]
-                    print(f"!!! ALERT: DUPLICATE BASE64 DETECTED !!!")
-                    print(f"Order {order_no} (Row {row}) got same label as Order {prev_order}")
-                else:
-                    seen_base64_hashes[label_hash] = order_no
-
-                # Cost validation logic
-                if abs(actual_cost - expected_cost) > 0.01:
-                    print(f"COST MISMATCH for {order_no}: Expected {expected_cost}, got {actual_cost}")
-                    ws.cell(row=row, column=20).value = actual_cost
-                    ws.cell(row=row, column=20).fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-                    # Even if cost mismatches, SS creates the label, so we must add it to the void list
-                    created_shipment_ids.append({"shipment_id":shipment_id, "order_no":order_no})
-                    batch_failed = True
-                    break
-                else:
-                    created_shipment_ids.append({"shipment_id":shipment_id, "order_no":order_no})
-                    session_affected_rows.append(row)
-                    
-                    order_metadata_list.append({
-                        "base64": b64_data,
-                        "name": customer_name,
-                        "order_no": str(order_no),
-                        "address": cust_address,
-                        "package": str(sku_pkg),
-                        "gp_no": str(ws.cell(row=row, column=16).value or "N/A"),
-                        "interchange": str(ws.cell(row=row, column=17).value or "N/A"),
-                        "store_name": str(ws.cell(row=row, column=18).value or "N/A")
-                    })
-                    ws.cell(row=row, column=19).value = "SHIPPED"
-            else:
-                print(f"API Error for {order_no}: {res.text}")
+                seen_base64_hashes[label_hash] = order_no
+
+            # Cost validation logic
+            if abs(actual_cost - job["expected_cost"]) > 0.01:
+                print(f"COST MISMATCH for {order_no}: Expected {job['expected_cost']}, got {actual_cost}")
+                cost_mismatches[row] = actual_cost
                 batch_failed = True
-                break
+                continue
+
+            ship_to = job["order"].get("shipTo", {})
+            order_metadata_list.append({
+                "base64": b64_data,
+                "name": ship_to.get("name", "N/A"),
+                "order_no": str(order_no),
+                "address": f"{ship_to.get('street1')}\n{ship_to.get('city')}, {ship_to.get('state')} {ship_to.get('postalCode')}",
+                "package": str(job["sku_pkg"]),
+                "gp_no": str(entry.get("GP") or "N/A"),
+                "interchange": str(entry.get("Interchange") or "N/A"),
+                "store_name": str(entry.get("Store Name") or "N/A")
+            })
+            shipped_rows[row] = "SHIPPED"
 
     except Exception as e:
-        # This catches HTTP Connection errors, timeouts, and code crashes
+        # This catches HTTP Connection errors, timeouts, API errors and code crashes
         print(f"CRITICAL ERROR ENCOUNTERED: {e}")
         batch_failed = True
 
     # --- FINAL CLEANUP / VOIDING LOGIC ---
     if batch_failed:
         print(f"Batch failed. Voiding {len(created_shipment_ids)} labels...")
-        # Surgical Rollback
-        for row_idx in session_affected_rows:
-            ws.cell(row=row_idx, column=19).value = ""
-
-        # Void all labels created in this specific loop
-        for item in created_shipment_ids:
-            s_id = item["shipment_id"]
-            o_no = item["order_no"]
-            try:
-                void_res = requests.post(f"{BASE_URL}/shipments/voidlabel", auth=SS_AUTH, json={"shipmentId": s_id}, timeout=10)
-
-                if void_res.status_code == 200:
-                    void_data = void_res.json()
-
-                    if void_data.get("approved"):
-                        print(f" [SUCCESS] Voided Order: {o_no} (Shipment ID: {s_id})")
-                    else:
-                        print(f"  [WARNING] ShipStation denied void for Order {o_no}: {void_data.get('message')}")
-                else:
-                    print(f"  [FAILED] HTTP {void_res.status_code} for Order {o_no} - {void_res.text}")
-
-            except Exception as void_err:
-                print(f"Could not void Order {o_no} (ID: {s_id}): {void_err}")
-        
-        wb.save(config.main_file)
+        # Nothing was marked SHIPPED yet; only the cost mismatches (if any) are written back
+        # Labels ShipStation wouldn't void are still paid for, so they join the manual list
+        manual_void.extend(item["order_no"] for item in void_labels(created_shipment_ids))
+        for o_no in manual_void:
+            print(f"  [MANUAL VOID] Order {o_no} may have a label in ShipStation. Check and void it by hand.")
+        apply_log_updates(config.main_file, cost_mismatches=cost_mismatches, sheet_name=sheet_name)
         return False
     else:
         # Success path
@@ -295,7 +368,11 @@ def shipping_label_algo(sheet_name):
         full_path = os.path.join(downloads_path, filename)
         
         output_pdf = merge_labels_to_pdf(order_metadata_list, full_path)
-        wb.save(config.main_file)
+        apply_log_updates(config.main_file, status_updates=shipped_rows, sheet_name=sheet_name)
+        try:
+            decision_store.set_status([m["order_no"] for m in order_metadata_list], decision_store.STATUS_SHIPPED)
+        except Exception as e:
+            print(f"Decision store error: {e}")
         return output_pdf
     
 def create_label_page(base64_source, name, order_no, address, package, gp_no, interchange, store_name):
@@ -1,5 +1,5 @@
 import os
-import requests
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -9,6 +9,12 @@ script_path = Path(__file__).resolve()
 # 2. Go up two levels to reach 'daily_tool' folder
 project_root = script_path.parent.parent.parent
 
+# Run directly (python src/shipstation/check_codes.py) only this folder is on the path, so add the
+# project root for the shared session; python -m src.shipstation.check_codes works as well
+if __package__ in (None, ""):
+    sys.path.insert(0, str(project_root))
+from src.shipstation import session
+
 # 3. Join with '.env'
 env_path = project_root / '.env'
 
@@ -22,7 +28,7 @@ URL_BASE = 'https://ssapi.shipstation.com'
 def list_codes():
     print("Connecting to ShipStation...")
     try:
-        res = requests.get(f"{URL_BASE}/carriers", auth=(API_KEY, API_SECRET))
+        res = session.get(f"{URL_BASE}/carriers", auth=(API_KEY, API_SECRET))
         
         # If the status is not 200, print the error text and stop
         if res.status_code != 200:
@@ -36,13 +42,13 @@ def list_codes():
             print(f"\n[CARRIER: {c_code}]")
 
             # Get Services
-            s_res = requests.get(f"{URL_BASE}/carriers/listservices?carrierCode={c_code}", auth=(API_KEY, API_SECRET))
+            s_res = session.get(f"{URL_BASE}/carriers/listservices?carrierCode={c_code}", auth=(API_KEY, API_SECRET))
             if s_res.status_code == 200:
                 for s in s_res.json():
                     print(f"  - Service: {s['code']}")
             
             # Get Packages
-            p_res = requests.get(f"{URL_BASE}/carriers/listpackages?carrierCode={c_code}", auth=(API_KEY, API_SECRET))
+            p_res = session.get(f"{URL_BASE}/carriers/listpackages?carrierCode={c_code}", auth=(API_KEY, API_SECRET))
             if p_res.status_code == 200:
                 for p in p_res.json():
                     print(f"  - Package: {p['code']}")
@@ -1,10 +1,13 @@
 import os
-import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.shipstation import session, rate_limit
 from pathlib import Path
 from dotenv import load_dotenv
 
-current_dir = Path(__file__).resolve()
-project_root = next(p for p in current_dir.parents if (p / '.env').exists())
+# Same fixed location as rates.py: <project root>/.env, two levels above src/shipstation
+project_root = Path(__file__).resolve().parent.parent.parent
 env_path = project_root / '.env'
 
 load_dotenv(dotenv_path=env_path)
@@ -14,30 +17,128 @@ BASE_URL = "https://ssapi.shipstation.com"
 API_KEY = os.getenv("SHIPSTATION_API_KEY")
 API_SECRET = os.getenv("SHIPSTATION_API_SECRET")
 
-def get_shipments():
+# Largest page V1 allows for /orders
+ORDERS_PAGE_SIZE = 500
 
-    orders = []
-    page = 1
+# The index page shows a cached count; past this age it's refreshed in the background
+AWAITING_COUNT_TTL_SECONDS = 60
 
-    while True:
-        r = requests.get(
-            f"{BASE_URL}/orders",
-            auth=(API_KEY, API_SECRET),
-            params={
-                "orderStatus": "awaiting_shipment",
-                "pageSize": 100,
-                "page": page
-            }
-        )
+_count_lock = threading.Lock()
+_awaiting_count = {"count": None, "fetched_at": None, "refreshing": False}
 
-        r.raise_for_status
-        data = r.json()
+def _fetch_orders_page(page, modify_date_start=None):
+    params = {
+        "pageSize": ORDERS_PAGE_SIZE,
+        "page": page
+    }
+    if modify_date_start:
+        params["modifyDateStart"] = modify_date_start
+    else:
+        params["orderStatus"] = "awaiting_shipment"
 
-        orders.extend(data.get("orders", []))
+    r = session.get(
+        f"{BASE_URL}/orders",
+        auth=(API_KEY, API_SECRET),
+        params=params
+    )
 
-        if page >= data.get("pages",1):
-            break
+    r.raise_for_status()
+    return r.json()
 
-        page += 1
+def iter_shipments(modify_date_start=None):
+    """
+        Streaming version of get_shipments: yields orders as pages arrive, so callers can start
+        working on page 1 while the rest downloads. Page 1 tells us how many pages there are;
+        the others are fetched concurrently (the V1 limiter decides how many really go out) and
+        yielded in page order. An order that shows up on two pages (the list shifted between
+        requests) is only yielded once.
+    """
+    first = _fetch_orders_page(1, modify_date_start)
+    seen = set()
 
-    return orders
\ No newline at end of file
+    def fresh(orders):
+        for order in orders:
+            if order.get("orderId") not in seen:
+                seen.add(order.get("orderId"))
+                yield order
+
+    yield from fresh(first.get("orders", []))
+
+    pages = first.get("pages", 1) or 1
+    if pages <= 1:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(rate_limit.V1_MAX_CONCURRENCY, pages - 1))
+    try:
+        futures = [executor.submit(_fetch_orders_page, page, modify_date_start) for page in range(2, pages + 1)]
+        for future in futures:
+            yield from fresh(future.result().get("orders", []))
+    finally:
+        # A caller that stops early (or a failed page) shouldn't leave the other pages downloading
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_shipments(modify_date_start=None):
+    """
+        Fetches every awaiting_shipment order from V1.
+        With modify_date_start ("YYYY-MM-DD HH:MM:SS", ShipStation account time) it instead returns
+        every order modified since then in any status, so callers can also see orders that left
+        awaiting_shipment (shipped, cancelled, on hold).
+    """
+    return list(iter_shipments(modify_date_start))
+
+def fetch_awaiting_count():
+    """
+        One V1 request: pageSize=1 and read the "total" field instead of paging through every order.
+        Returns: # of awaiting_shipment orders
+    """
+    r = session.get(
+        f"{BASE_URL}/orders",
+        auth=(API_KEY, API_SECRET),
+        params={"orderStatus": "awaiting_shipment", "pageSize": 1, "page": 1}
+    )
+    r.raise_for_status()
+    return int(r.json().get("total", 0))
+
+def set_awaiting_count(count):
+    """Primes the cached count, e.g. with the number of orders a full extract just fetched."""
+    with _count_lock:
+        _awaiting_count["count"] = count
+        _awaiting_count["fetched_at"] = time.time()
+
+def _refresh_awaiting_count():
+    try:
+        set_awaiting_count(fetch_awaiting_count())
+    except Exception as e:
+        print(f"Awaiting count refresh failed: {e}")
+    finally:
+        with _count_lock:
+            _awaiting_count["refreshing"] = False
+
+def count_awaiting_shipments():
+    """
+        Displays the number of orders in awaiting shipment from shipstation.
+        Served from a cache: the first call fetches it (one request), later calls return the cached
+        value right away and start a background refresh once it's older than AWAITING_COUNT_TTL_SECONDS.
+
+        Returns: (# of orders or None if it couldn't be fetched, age of that value in seconds or None)
+        Used: app.py
+    """
+    with _count_lock:
+        fetched_at = _awaiting_count["fetched_at"]
+        stale = fetched_at is None or time.time() - fetched_at > AWAITING_COUNT_TTL_SECONDS
+        start_refresh = stale and fetched_at is not None and not _awaiting_count["refreshing"]
+        if start_refresh:
+            _awaiting_count["refreshing"] = True
+
+    if fetched_at is None:
+        # Nothing cached yet: this one request is the whole cost
+        try:
+            set_awaiting_count(fetch_awaiting_count())
+        except Exception as e:
+            print(f"Awaiting count fetch failed: {e}")
+            return None, None
+    elif start_refresh:
+        threading.Thread(target=_refresh_awaiting_count, name="awaiting-count", daemon=True).start()
+
+    with _count_lock:
+        return _awaiting_count["count"], time.time() - _awaiting_count["fetched_at"]
@@ -0,0 +1,149 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date
+import config
+
+# Local SQLite file holding normalized get_live_rates results
+CACHE_PATH = getattr(config, "RATE_CACHE_PATH", "data/rate_cache.sqlite")
+
+# How long a stored quote is trusted before we pay for a live call again. Keys also carry the
+# ship date, so a quote (with its absolute estimated_delivery_date) never outlives its day.
+TTL_HOURS = getattr(config, "RATE_CACHE_TTL_HOURS", 12)
+
+# Bump in config.py when USPS/UPS publish new prices; rows saved under another version are dropped
+PRICE_VERSION = str(getattr(config, "RATE_CACHE_PRICE_VERSION", "1"))
+
+_lock = threading.Lock()
+_initialized = False
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    if not _initialized:
+        with _lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS rate_quotes (
+                        cache_key TEXT PRIMARY KEY,
+                        price_version TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        is_residential INTEGER NOT NULL,
+                        rates_json TEXT NOT NULL
+                    )
+                """)
+                conn.execute("DELETE FROM rate_quotes WHERE price_version != ?", (PRICE_VERSION,))
+                conn.execute("DELETE FROM rate_quotes WHERE created_at < ?", (time.time() - TTL_HOURS * 3600,))
+                conn.commit()
+                _initialized = True
+    return conn
+
+def normalize_address(ship_to):
+    """street1 street2 city, lowercased with whitespace collapsed; "" when there's no address."""
+    ship_to = ship_to or {}
+    parts = [ship_to.get("street1"), ship_to.get("street2"), ship_to.get("city")]
+    return re.sub(r"\s+", " ", " ".join(str(p) for p in parts if p)).strip().lower()
+
+def make_key(carrier, service, pkg, weight, dims, to_zip, is_residential, source="shipment", ship_to=None, ship_date=None):
+    """
+        Builds the cache key for a quote from the shipment's shape:
+        carrier|service|package|weight|LxWxH|ZIP5|residential|source|ship date[|address]
+        source separates estimate prices from full create->rate prices.
+        "shipment" quotes come back with the address's own residential flag, so their key also
+        holds the normalized street address; otherwise one address's flag would be served to
+        every other address in the ZIP.
+        ship_date (default today) keeps cached delivery dates from being reused on a later day.
+    """
+    try:
+        weight_key = f"{float(weight):g}"
+    except (TypeError, ValueError):
+        weight_key = str(weight)
+    dims_key = "x".join(f"{float(d):g}" for d in dims) if dims else "-"
+
+    return "|".join([
+        str(carrier or "").lower(),
+        str(service or "*").lower(),
+        str(pkg or "").lower(),
+        weight_key,
+        dims_key,
+        str(to_zip or "")[:5],
+        "R" if is_residential else "C",
+        source,
+        (ship_date or date.today()).isoformat()
+    ] + ([normalize_address(ship_to)] if source == "shipment" else []))
+
+def get(key):
+    """
+        Returns (rates, is_residential) for a fresh entry, or None on a miss/expired entry.
+        Every call returns newly built dicts so callers can mutate them freely.
+    """
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                "SELECT created_at, is_residential, rates_json FROM rate_quotes WHERE cache_key = ? AND price_version = ?",
+                (key, PRICE_VERSION)
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Rate cache read error: {e}")
+        row = None
+
+    with _lock:
+        if row is None or (time.time() - row[0]) > TTL_HOURS * 3600:
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+
+    return json.loads(row[2]), bool(row[1])
+
+def put(key, rates, is_residential):
+    """Stores a non-empty quote result. Empty lists are usually API errors, so they're never cached."""
+    if not rates:
+        return
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_quotes (cache_key, price_version, created_at, is_residential, rates_json) VALUES (?, ?, ?, ?, ?)",
+                (key, PRICE_VERSION, time.time(), int(bool(is_residential)), json.dumps(rates))
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Rate cache write error: {e}")
+        return
+
+    with _lock:
+        _stats["stores"] += 1
+
+def invalidate():
+    """Drops every cached quote (e.g. right after a carrier price change)."""
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM rate_quotes")
+        conn.commit()
+    finally:
+        conn.close()
+
+def reset_stats():
+    with _lock:
+        for k in _stats:
+            _stats[k] = 0
+
+def stats():
+    """Hit/miss counters since the last reset_stats(), plus the hit rate in percent."""
+    with _lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / lookups * 100, 1) if lookups else 0.0
+    return snapshot
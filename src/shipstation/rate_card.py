@@ -0,0 +1,206 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+import config
+from src.shipstation import rate_cache
+
+# Origin is always Vernon, CA 90058, so the destination ZIP3 stands in for the carrier zone
+CARD_PATH = getattr(config, "RATE_CARD_PATH", rate_cache.CACHE_PATH)
+RATE_CARD_ENABLED = getattr(config, "RATE_CARD_ENABLED", True)
+
+# A cell answers without the API only when it has enough agreeing, recent observations
+MIN_SAMPLES = getattr(config, "RATE_CARD_MIN_SAMPLES", 3)
+MAX_SPREAD = getattr(config, "RATE_CARD_MAX_SPREAD", 0.25)   # dollars between cheapest and priciest sample
+STALE_DAYS = getattr(config, "RATE_CARD_STALE_DAYS", 7)
+
+_lock = threading.Lock()
+_initialized = False
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        os.makedirs(os.path.dirname(CARD_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(CARD_PATH, timeout=30)
+    if not _initialized:
+        with _lock:
+            if not _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                # Cards from before estimate and create->rate prices were split mix both sources; start over
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(rate_card)")}
+                if columns and "source" not in columns:
+                    conn.execute("DROP TABLE rate_card")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS rate_card (
+                        carrier TEXT NOT NULL,
+                        service TEXT NOT NULL,
+                        package TEXT NOT NULL,
+                        zip3 TEXT NOT NULL,
+                        weight_bracket REAL NOT NULL,
+                        residential TEXT NOT NULL,
+                        source TEXT NOT NULL,
+                        price_version TEXT NOT NULL,
+                        samples INTEGER NOT NULL,
+                        mean_cost REAL NOT NULL,
+                        min_cost REAL NOT NULL,
+                        max_cost REAL NOT NULL,
+                        transit_days INTEGER,
+                        service_name TEXT,
+                        carrier_code TEXT,
+                        last_seen REAL NOT NULL,
+                        PRIMARY KEY (carrier, service, package, zip3, weight_bracket, residential, source)
+                    )
+                """)
+                conn.execute("DELETE FROM rate_card WHERE price_version != ?", (rate_cache.PRICE_VERSION,))
+                conn.commit()
+                _initialized = True
+    return conn
+
+def billable_bracket(carrier, pkg, weight, dims):
+    """
+        Weight bracket the carrier actually prices on.
+        Flat rates ignore weight (bracket 0). Otherwise dimensional weight applies (UPS always at /139,
+        USPS at /166 over one cubic foot), rounded up to the pound, or to the quarter pound under 1 lb.
+    """
+    if "flat_rate" in str(pkg):
+        return 0.0
+
+    try:
+        billable = float(weight)
+    except (TypeError, ValueError):
+        return None
+
+    if dims and all(dims):
+        volume = float(dims[0]) * float(dims[1]) * float(dims[2])
+        if carrier == "ups":
+            billable = max(billable, volume / 139)
+        elif volume > 1728:
+            billable = max(billable, volume / 166)
+
+    if billable < 1:
+        return math.ceil(billable * 4) / 4
+    return float(math.ceil(billable))
+
+def _cell(carrier, pkg, weight, dims, to_zip, is_residential, source):
+    bracket = billable_bracket(carrier, pkg, weight, dims)
+    zip3 = str(to_zip or "")[:3]
+    if bracket is None or len(zip3) < 3:
+        return None
+    package = pkg if "flat_rate" in str(pkg) else "package"
+    # USPS has no residential surcharge. UPS create->rate prices depend on the detected
+    # residential flag; the estimate endpoint is always asked with the flag "unknown" (U)
+    if carrier != "ups":
+        residential = "-"
+    elif source == "estimate":
+        residential = "U"
+    elif is_residential is None:
+        return None
+    else:
+        residential = "R" if is_residential else "C"
+    return package, zip3, bracket, residential
+
+def record(carrier, pkg, weight, dims, to_zip, rates, is_residential, source):
+    """
+        Folds a live get_live_rates result into the card. Called for every live quote,
+        so the card keeps learning from normal runs.
+        source ("estimate" / "shipment") keeps the two price sources in separate cells.
+        UPS create->rate prices are only recorded when the residential flag is known.
+    """
+    if not RATE_CARD_ENABLED or not rates:
+        return
+    cell = _cell(str(carrier).lower(), pkg, weight, dims, to_zip, is_residential, source)
+    if cell is None:
+        return
+    package, zip3, bracket, residential = cell
+    now = time.time()
+
+    try:
+        conn = _connect()
+        try:
+            for r in rates:
+                cost = r.get("shipmentCost")
+                if not cost or cost <= 0 or not r.get("serviceCode"):
+                    continue
+                delivery = r.get("estimated_delivery_date")
+                transit = (date.fromisoformat(delivery[:10]) - date.today()).days if delivery else None
+                conn.execute("""
+                    INSERT INTO rate_card (carrier, service, package, zip3, weight_bracket, residential, source, price_version,
+                                           samples, mean_cost, min_cost, max_cost, transit_days, service_name, carrier_code, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (carrier, service, package, zip3, weight_bracket, residential, source) DO UPDATE SET
+                        mean_cost = (mean_cost * samples + excluded.mean_cost) / (samples + 1),
+                        samples = samples + 1,
+                        min_cost = MIN(min_cost, excluded.min_cost),
+                        max_cost = MAX(max_cost, excluded.max_cost),
+                        transit_days = MAX(COALESCE(transit_days, excluded.transit_days), COALESCE(excluded.transit_days, transit_days)),
+                        service_name = excluded.service_name,
+                        carrier_code = excluded.carrier_code,
+                        last_seen = excluded.last_seen
+                """, (str(carrier).lower(), r["serviceCode"], package, zip3, bracket, residential, source, rate_cache.PRICE_VERSION,
+                      cost, cost, cost, transit, r.get("serviceName"), r.get("carrierCode"), now))
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Rate card write error: {e}")
+
+def lookup(carrier, service, pkg, weight, dims, to_zip, is_residential=True, source="shipment", **_):
+    """
+        Answers a quote from the card when every matching cell is confident
+        (>= MIN_SAMPLES, spread <= MAX_SPREAD, seen within STALE_DAYS).
+
+        source picks the price source the caller would have used live. UPS create->rate cells are
+        always read as residential because UPS is only ever used for residential deliveries.
+        Extra keyword args are ignored so a get_live_rates quote dict can be passed as-is.
+
+        Returns: list of standard rate dicts flagged "rate_card": True, or None when the API is needed
+    """
+    if not RATE_CARD_ENABLED:
+        return None
+    carrier = str(carrier).lower()
+    cell = _cell(carrier, pkg, weight, dims, to_zip, carrier == "ups" or is_residential, source)
+    if cell is None:
+        return None
+    package, zip3, bracket, residential = cell
+
+    query = """
+        SELECT service, samples, mean_cost, min_cost, max_cost, transit_days, service_name, carrier_code, last_seen
+        FROM rate_card
+        WHERE carrier = ? AND package = ? AND zip3 = ? AND weight_bracket = ? AND residential = ? AND source = ? AND price_version = ?
+    """
+    params = [carrier, package, zip3, bracket, residential, source, rate_cache.PRICE_VERSION]
+    if service:
+        query += " AND service = ?"
+        params.append(service.lower())
+
+    try:
+        conn = _connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Rate card read error: {e}")
+        return None
+
+    if not rows:
+        return None
+
+    stale_before = time.time() - STALE_DAYS * 86400
+    rates = []
+    for svc, samples, mean_cost, min_cost, max_cost, transit, svc_name, carrier_code, last_seen in rows:
+        if samples < MIN_SAMPLES or (max_cost - min_cost) > MAX_SPREAD or last_seen < stale_before or transit is None:
+            return None
+        rates.append({
+            "shipmentCost": round(mean_cost, 2),
+            "serviceCode": svc,
+            "serviceName": svc_name,
+            "carrierCode": carrier_code,
+            "packageType": package,
+            "estimated_delivery_date": (date.today() + timedelta(days=transit)).isoformat(),
+            "comparison_log": f"{svc_name} (rate card)",
+            "rate_card": True
+        })
+    return rates
@@ -0,0 +1,123 @@
+import threading
+import time
+
+# ShipStation budgets per API key. V1 is documented at 40 requests/minute; V2 allows 200.
+V1_REQUESTS_PER_MINUTE = 40
+V2_REQUESTS_PER_MINUTE = 200
+
+# Upper bounds for in-flight requests; the live limit adapts between 1 and these
+V1_MAX_CONCURRENCY = 5
+V2_MAX_CONCURRENCY = 15
+
+class RateLimiter:
+    """
+        Token bucket + adaptive concurrency for one ShipStation API.
+
+        - Tokens refill continuously at requests_per_minute / 60 per second. The bucket only holds
+          max_concurrency tokens (and starts there), so a burst can't add a second minute's worth of
+          calls on top of the refill; any 60s window stays within the limit plus one small burst.
+        - X-Rate-Limit-Remaining / X-Rate-Limit-Reset from every response resync the bucket
+          with the server's own count (other tools share the same key).
+        - A 429 (or an empty bucket) pauses every caller until Retry-After / the reset time
+          and halves the concurrency limit; healthy responses grow it back one step at a time.
+    """
+
+    def __init__(self, name, requests_per_minute, max_concurrency):
+        self.name = name
+        self.limit = float(requests_per_minute)
+        self.capacity = float(max_concurrency)
+        self.refill_per_sec = requests_per_minute / 60.0
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.tokens = self.capacity
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.refill_per_sec)
+        self._last_refill = now
+
+    def acquire(self):
+        """Blocks until a token and a concurrency slot are both available."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.in_flight >= self.concurrency:
+                    wait = None
+                elif self.tokens < 1:
+                    wait = (1 - self.tokens) / self.refill_per_sec
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+                self._cond.wait(wait)
+
+    def release(self, response=None):
+        """Frees the slot and adapts the budget from the response's rate-limit headers."""
+        with self._cond:
+            self.in_flight -= 1
+            if response is not None:
+                self._observe(response)
+            self._cond.notify_all()
+
+    def _observe(self, response):
+        headers = response.headers
+        now = time.monotonic()
+        remaining = _to_float(headers.get("X-Rate-Limit-Remaining"))
+        reset = _to_float(headers.get("X-Rate-Limit-Reset"))
+
+        if response.status_code == 429:
+            self.throttled += 1
+            retry_after = _to_float(headers.get("Retry-After")) or reset or 60
+            self.paused_until = max(self.paused_until, now + retry_after)
+            self.tokens = 0
+            self.concurrency = max(1, self.concurrency // 2)
+            print(f"[{self.name}] 429 throttled. Pausing {retry_after:.1f}s, concurrency -> {self.concurrency}")
+            return
+
+        if remaining is not None:
+            self.tokens = min(self.tokens, remaining)
+            if remaining <= 0 and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+            # Stay just under the limit: back off when under 10% is left, grow while over 25% is left
+            if remaining < self.limit * 0.10:
+                self.concurrency = max(1, self.concurrency - 1)
+            elif remaining > self.limit * 0.25 and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+
+    def current_concurrency(self):
+        with self._cond:
+            return self.concurrency
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "tokens": round(self.tokens, 1),
+                "in_flight": self.in_flight,
+                "concurrency": self.concurrency,
+                "throttled": self.throttled
+            }
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+V1 = RateLimiter("V1", V1_REQUESTS_PER_MINUTE, V1_MAX_CONCURRENCY)
+V2 = RateLimiter("V2", V2_REQUESTS_PER_MINUTE, V2_MAX_CONCURRENCY)
+
+def order_workers():
+    """
+        How many orders main.py should have in flight right now. Orders mostly wait on V2 quotes,
+        so this follows V2's live concurrency: it shrinks after 429s / a low remaining budget and
+        grows back while the API has headroom. Ask again whenever an order finishes.
+    """
+    return max(1, V2.current_concurrency())
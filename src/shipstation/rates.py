@@ -1,15 +1,39 @@
 import os
-import requests
+from src.shipstation import session, rate_cache, rate_card
+from src.shipstation.rate_limit import V2_MAX_CONCURRENCY
+from src.shipstation.singleflight import SingleFlight
 from datetime import date, timedelta, datetime
 from pathlib import Path
 from dotenv import load_dotenv
+import copy
 import json
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import config
 
 SHIPMENT_URL="https://api.shipstation.com/v2/shipments"
 RATES_URL = "https://api.shipstation.com/v2/rates"
+BULK_RATES_URL = "https://api.shipstation.com/v2/rates/bulk"
 
 URL = "https://api.shipstation.com/v2/rates/estimate"
 
+# The only services we ever ship with; everything else the API returns is dropped
+TARGET_SERVICES = ['usps_ground_advantage', 'usps_priority_mail', 'ups_ground', 'ups_ground_saver','usps_first_class_mail']
+
+# Rating strategies for non-flat-rate packages (flat rates always use the estimate endpoint):
+#   "estimate" - one /v2/rates/estimate call per quote
+#   "verify"   - estimate every option, then re-quote only the winner via create -> rate -> cancel
+#   "shipment" - create -> rate -> cancel for every quote (3 calls each)
+STRATEGY_ESTIMATE = "estimate"
+STRATEGY_VERIFY = "verify"
+STRATEGY_SHIPMENT = "shipment"
+# Defaults to the original create -> rate -> cancel pricing; set RATING_STRATEGY = "verify" in config.py to opt in
+RATING_STRATEGY = getattr(config, "RATING_STRATEGY", STRATEGY_SHIPMENT)
+
+FLAT_RATE_CODES = ['flat_rate_padded_envelope', 'flat_rate_envelope', 'medium_flat_rate_box', 'large_flat_rate_box']
+
 CARRIER_MAP = {
     "usps": "se-167930",
     "ups": "se-196204"
@@ -28,23 +52,96 @@ V2_API_KEY = os.getenv("SHIPSTATION_V2_PRODUCTION_KEY")
 V1_SHIPSTATION_API_KEY=os.getenv("SHIPSTATION_API_KEY")
 V1_SHIPSTATION_API_SECRET=os.getenv("SHIPSTATION_API_SECRET")
 
-def get_live_rates(order_no,carrier, service, pkg, weight, dims=None, to_state="CA", to_zip="90058",is_residential=False):
+# Run-scoped {orderNumber: {"order_id", "ship_to"}} filled from get_shipments() by cache_orders()
+ORDER_CACHE = {}
+_order_cache_lock = threading.Lock()
+
+# Max temporary shipments (one per address + package shape) created per /v2/shipments request in get_live_rates_batch
+SHIPMENT_BATCH_SIZE = 20
+
+# Quotes in flight at once across all order workers (each order plans ~4-12 quotes).
+# rate_limit.V2 decides how many of them actually hit the API at the same time.
+QUOTE_WORKERS = V2_MAX_CONCURRENCY
+_quote_pool = None
+_quote_pool_lock = threading.Lock()
+
+# Identical quotes requested at the same time (same SKU to the same ZIP from several workers) share one call
+_quote_flight = SingleFlight()
+
+# Temporary rating shipments waiting to be cancelled by the background cleanup threads
+CANCEL_WORKERS = 2
+_cancel_queue = queue.Queue()
+_cancel_start_lock = threading.Lock()
+_cancel_workers_started = False
+
+def get_live_rates(order_no,carrier, service, pkg, weight, dims=None, to_state="CA", to_zip="90058",is_residential=False, order_info=None, strategy=None):
+
+    """
+        Cache-aware entry point for real-time shipping rates.
+
+        Quotes are keyed by shipment shape (carrier, service, package, weight, dims, ZIP5,
+        residential flag, ship date, and the street address for create->rate quotes) in rate_cache, so repeat SKU/lane combinations skip the
+        create -> rate -> cancel round trip entirely. Misses go to _fetch_live_rates through a
+        singleflight, so concurrent identical misses wait on one in-flight call.
+
+        strategy: one of the STRATEGY_* values, defaults to RATING_STRATEGY. Anything other
+        than "shipment" prices non-flat packages with the single-call estimate endpoint.
+
+        Returns: tuple: (list of processed_rate_dicts, boolean is_residential)
+    """
+
+    print(f"DEBUG get_live_rates|Order:{order_no} entered")
+
+    source = quote_source(pkg, strategy)
+    if source == "shipment" and not order_info:
+        # The detected residential flag belongs to the street address, so it's part of the key
+        order_info = get_order_address(order_no)
+    cache_key = rate_cache.make_key(carrier, service, pkg, weight, dims, to_zip, is_residential, source, (order_info or {}).get("ship_to"))
+    cached = rate_cache.get(cache_key)
+    if cached is not None:
+        print(f"DEBUG get_live_rates|Order:{order_no} rate cache hit")
+        return cached
+
+    def fetch():
+        result = _fetch_live_rates(order_no, carrier, service, pkg, weight, dims, to_state, to_zip, is_residential, order_info, source)
+        rate_cache.put(cache_key, result[0], result[1])
+        rate_card.record(carrier, pkg, weight, dims, to_zip, result[0], result[1], source)
+        return result
+
+    return _quote_flight.do(cache_key, fetch)
+
+def quote_source(pkg, strategy=None):
+    """Which price a quote gets: "estimate" (flat rates, non-shipment strategies) or "shipment" (create -> rate)."""
+    strategy = strategy or RATING_STRATEGY
+    return "estimate" if pkg in FLAT_RATE_CODES or strategy != STRATEGY_SHIPMENT else "shipment"
+
+def winner_strategy():
+    """
+        Strategy to use for a quote that decides what we actually pay (a fixed-service order,
+        a verified winner or the Priority fallback). "verify" upgrades these to the full path.
+    """
+    return STRATEGY_SHIPMENT if RATING_STRATEGY == STRATEGY_VERIFY else RATING_STRATEGY
+
+def _fetch_live_rates(order_no, carrier, service, pkg, weight, dims, to_state, to_zip, is_residential, order_info, source="shipment"):
 
     """
         Fetches real-time shipping rates from the ShipStation V2 API.
-        Process follows 'Create -> Rate -> Cancel' Shipment Workflow:
+        Flat rates and source="estimate" use a single /v2/rates/estimate call; everything
+        else follows the 'Create -> Rate -> Cancel' Shipment Workflow:
 
         1. Create a temporary shipment to generate a shipment_id
         2. Request rates for that specific shipment_id
-        3. Cancel the temporary shipment so it doesnt appear in Shipstation
+        3. Queue the temporary shipment for cancellation so it doesnt appear in Shipstation
         4. Filter and standardize the results for the main application
 
+        order_info: {"order_id", "ship_to"} from the run's order cache. Looked up via
+        get_order_address (cache first, V1 fallback) when not passed in.
+
         Returns: tuple: (list of processed_rate_dicts, boolean is_residential)
     """
 
-    print(f"DEBUG get_live_rates|Order:{order_no} entered")
-
-    order_info = get_order_address(order_no)
+    if not order_info:
+        order_info = get_order_address(order_no)
     if not order_info:
         return [], is_residential
     
@@ -54,59 +151,26 @@ def get_live_rates(order_no,carrier, service, pkg, weight, dims=None, to_state="
         print(f"Unknown carrier for V2: {carrier}")
         return [], is_residential
     
-    flat_rate_codes = ['flat_rate_padded_envelope', 'flat_rate_envelope', 'medium_flat_rate_box', 'large_flat_rate_box']
-
-    if pkg in flat_rate_codes:
+    if pkg in FLAT_RATE_CODES or source == "estimate":
         print(f"DEBUG get_rate_estimate|Order:{order_no} entering get_rate_estimate")
-        est_result = get_rate_estimate(carrier_id, service, pkg, weight, dims, to_state, to_zip, addr)
-        
-        # 2. If it's a tuple, just take the first part (the list)
-        if isinstance(est_result, tuple):
-            est_result = est_result[0]
-            
-        # 3. Now return it safely
+        # OZ/Q-code/LxWxH packages are all plain parcels as far as the estimate endpoint is concerned
+        est_pkg = pkg if pkg in FLAT_RATE_CODES else "package"
+        est_result, _ = get_rate_estimate(carrier_id, service, est_pkg, weight, dims, to_state, to_zip, addr)
+
+        if not service:
+            est_result = [r for r in est_result if r['serviceCode'] in TARGET_SERVICES]
+
+        # The estimate endpoint can't tell residential from commercial, so the flag passes through untouched
         return est_result, is_residential
         
-    payload = {
-        "shipments": [{
-            "validate_address": "no_validation",
-            "ship_to": {
-                "name": "Test Customer",
-                "address_line1": addr.get("street1"),
-                "address_line2": addr.get("street2"),
-                "city_locality": addr.get("city"),
-                "state_province": to_state,
-                "postal_code": str(to_zip)[:5],
-                "country_code": "US"
-            },
-            "ship_from": {
-                "name": "3317 E 50th St",
-                "phone": "323-510-3700",
-                "address_line1": "3317 E 50th St",
-                "city_locality": "Vernon",
-                "state_province": "CA",
-                "postal_code": "90058",
-                "country_code": "US"
-            },
-            "packages": [{
-                "weight": {"value": float(weight), "unit": "pound"},
-                "dimensions": {
-                    "unit": "inch",
-                    "length": dims[0] if dims else 1,
-                    "width": dims[1] if dims else 1,
-                    "height": dims[2] if dims else 1
-                }
-            }]
-        }]
-    }
-
     headers = {
         "api-key": V2_API_KEY,
         "Content-Type": "application/json"
     }
 
     try:
-        ship_response = requests.post(SHIPMENT_URL,json=payload, headers=headers)
+        payload = {"shipments": [_shipment_payload(addr, to_state, to_zip, weight, dims)]}
+        ship_response = session.post(SHIPMENT_URL,json=payload, headers=headers)
         
         if ship_response.status_code != 200:
             print(f"Shipment Creation Failed: {ship_response.text}")
@@ -120,12 +184,7 @@ def get_live_rates(order_no,carrier, service, pkg, weight, dims=None, to_state="
             print(f"Error: No shipments returned in the response for {order_no}")
             return [], is_residential
         
-        residential_indicator = shipments_list[0].get("ship_to", {}).get("address_residential_indicator", "unknown")
-
-        if residential_indicator in ["no","unknown"]:
-            is_residential = False
-        else:
-            is_residential = True
+        is_residential = _is_residential(shipments_list[0])
         
         shipment_id = shipments_list[0].get("shipment_id")
 
@@ -140,88 +199,383 @@ def get_live_rates(order_no,carrier, service, pkg, weight, dims=None, to_state="
             }
         }
 
-        rate_response = requests.post(RATES_URL,json=rate_payload, headers=headers)
-        cancel_url = f"https://api.shipstation.com/v2/shipments/{shipment_id}/cancel"
-        requests.put(cancel_url, headers=headers)
+        rate_response = session.post(RATES_URL,json=rate_payload, headers=headers)
+        queue_cancel(shipment_id)
 
         if rate_response.status_code == 200:
             rate_data = rate_response.json()
 
             rates = rate_data.get("rate_response", {}).get("rates",[])
 
-            processed_rates = []
-            for r in rates:
-                # Calculate cost once here so main.py doesn't have to
-                base = r.get("shipping_amount", {}).get("amount", 0.0)
-                other = r.get("other_amount", {}).get("amount", 0.0)
-                
-                # Build a standardized dictionary for main.py
-                processed_rates.append({
-                    "shipmentCost": round(base + other, 2),
-                    "serviceCode": r.get("service_code"),
-                    "serviceName": r.get("service_type"),
-                    "carrierCode": r.get("carrier_code"),
-                    "packageType": r.get("package_type"),
-                    "estimated_delivery_date": r.get("estimated_delivery_date"),
-                    "comparison_log": f"{r.get('service_name')} (Direct)",
-                    "realName": r.get("service_name") or r.get("service_type")
-                })
-
-           # ONLY RETURN THE SERVICES WE ACTUALLY CARE ABOUT
-            target_services = ['usps_ground_advantage', 'usps_priority_mail', 'ups_ground', 'ups_ground_saver','usps_first_class_mail']
-            
-            is_standard_search = any(x in pkg.upper() for x in ["OZ", "PACKAGE"])
-
-            if not service: # If shopping/optimizing
-                return [
-                    r for r in processed_rates 
-                    if r['serviceCode'] in target_services 
-                    and (
-                        # Match A: Strict match for Flat Rates (Fixes your $10.30 problem)
-                        r['packageType'] == pkg.lower() 
-                        or 
-                        # Match B: Fuzzy match for OZ/Standard (Fixes your None problem)
-                        (is_standard_search and r['packageType'] in ["package", "parcel", None])
-                    )
-                ], is_residential
-            
-            filtered_results = []
-            for r in processed_rates:
-                service_match = r['serviceCode'] == service.lower()
-
-                if is_standard_search:
-                    # If SKU says "5-8 OZ", look for "package" in API results
-                    package_match = r['packageType'] in ["package", "parcel", None]
-                else:
-                    # If SKU says "flat_rate_envelope", look for exact match
-                    package_match = r['packageType'] == pkg.lower()
-
-                if service_match and package_match:
-                    filtered_results.append(r)
-            
-            return filtered_results, is_residential
+            return _standardize_rates(rates, service, pkg), is_residential
         else:
             print(f"V2 Error {rate_response.status_code}: {rate_response.text}")
             return [], is_residential
     except Exception as e:
         print(f"V2 Connection Error: {e}")
         return [], is_residential
+
+def _shipment_payload(addr, to_state, to_zip, weight, dims):
+    """Temporary V2 shipment used only to get rated; cancelled right after."""
+    return {
+        "validate_address": "no_validation",
+        "ship_to": {
+            "name": "Test Customer",
+            "address_line1": addr.get("street1"),
+            "address_line2": addr.get("street2"),
+            "city_locality": addr.get("city"),
+            "state_province": to_state,
+            "postal_code": str(to_zip)[:5],
+            "country_code": "US"
+        },
+        "ship_from": {
+            "name": "3317 E 50th St",
+            "phone": "323-510-3700",
+            "address_line1": "3317 E 50th St",
+            "city_locality": "Vernon",
+            "state_province": "CA",
+            "postal_code": "90058",
+            "country_code": "US"
+        },
+        "packages": [{
+            "weight": {"value": float(weight), "unit": "pound"},
+            "dimensions": {
+                "unit": "inch",
+                "length": dims[0] if dims else 1,
+                "width": dims[1] if dims else 1,
+                "height": dims[2] if dims else 1
+            }
+        }]
+    }
+
+def _is_residential(shipment):
+    residential_indicator = shipment.get("ship_to", {}).get("address_residential_indicator", "unknown")
+    return residential_indicator not in ["no","unknown"]
+
+def _standardize_rates(rates, service, pkg):
+    """
+        Converts raw V2 rates into the standard dicts main.py/optimizer.py expect and keeps only
+        the requested service (or every TARGET_SERVICES entry when service is None) and package.
+    """
+    processed_rates = []
+    for r in rates:
+        # Calculate cost once here so main.py doesn't have to
+        base = r.get("shipping_amount", {}).get("amount", 0.0)
+        other = r.get("other_amount", {}).get("amount", 0.0)
+        
+        # Build a standardized dictionary for main.py
+        processed_rates.append({
+            "shipmentCost": round(base + other, 2),
+            "serviceCode": r.get("service_code"),
+            "serviceName": r.get("service_type"),
+            "carrierCode": r.get("carrier_code"),
+            "packageType": r.get("package_type"),
+            "estimated_delivery_date": r.get("estimated_delivery_date"),
+            "comparison_log": f"{r.get('service_name')} (Direct)",
+            "realName": r.get("service_name") or r.get("service_type")
+        })
+
+    # ONLY RETURN THE SERVICES WE ACTUALLY CARE ABOUT (TARGET_SERVICES)
+    is_standard_search = any(x in pkg.upper() for x in ["OZ", "PACKAGE"])
+
+    if not service: # If shopping/optimizing
+        return [
+            r for r in processed_rates 
+            if r['serviceCode'] in TARGET_SERVICES 
+            and (
+                # Match A: Strict match for Flat Rates (Fixes your $10.30 problem)
+                r['packageType'] == pkg.lower() 
+                or 
+                # Match B: Fuzzy match for OZ/Standard (Fixes your None problem)
+                (is_standard_search and r['packageType'] in ["package", "parcel", None])
+            )
+        ]
     
+    filtered_results = []
+    for r in processed_rates:
+        service_match = r['serviceCode'] == service.lower()
+
+        if is_standard_search:
+            # If SKU says "5-8 OZ", look for "package" in API results
+            package_match = r['packageType'] in ["package", "parcel", None]
+        else:
+            # If SKU says "flat_rate_envelope", look for exact match
+            package_match = r['packageType'] == pkg.lower()
+
+        if service_match and package_match:
+            filtered_results.append(r)
+    
+    return filtered_results
+
+def get_live_rates_batch(quotes):
+    """
+        Batch version of get_live_rates for many orders and dimension sets at once.
+
+        :param quotes: list of dicts holding get_live_rates keyword arguments
+                       (order_no, carrier, service, pkg, weight, dims, to_state, to_zip,
+                       is_residential, order_info, strategy)
+
+        Cache hits are answered locally. Each remaining quote is claimed in the same singleflight
+        get_live_rates uses: a quote already in flight elsewhere (another order worker, a verify
+        re-quote) is waited on instead of sent again, and other callers wait on this batch's quotes.
+        The create -> rate -> cancel quotes this batch leads are grouped
+        by shipment shape (address, weight, dims): each shape gets ONE temporary shipment, rated once
+        for every carrier its quotes ask for, so Ground Advantage, Priority and UPS for the same box
+        share a shipment. Shipments are created SHIPMENT_BATCH_SIZE per /v2/shipments request, rated
+        with /v2/rates/bulk and handed to the background cancel queue.
+        Estimate-priced quotes and shipment chunks all run at the same time on the shared
+        quote pool, so the batch takes as long as its slowest member.
+
+        Returns: list of (rates, is_residential) tuples in the same order as quotes
+    """
+    results = [None] * len(quotes)
+    shapes = {}
+    claimed = []
+    waiting = []
+    futures = {}
+    pool = _get_quote_pool()
+
+    for idx, q in enumerate(quotes):
+        pkg = q["pkg"]
+        if quote_source(pkg, q.get("strategy")) == "estimate":
+            futures[pool.submit(get_live_rates, **q)] = [idx]
+            continue
+
+        order_info = q.get("order_info") or get_order_address(q["order_no"])
+        cache_key = rate_cache.make_key(q["carrier"], q.get("service"), pkg, q["weight"], q.get("dims"), q.get("to_zip"), q.get("is_residential", False), "shipment", (order_info or {}).get("ship_to"))
+        cached = rate_cache.get(cache_key)
+        if cached is not None:
+            results[idx] = cached
+            continue
+
+        carrier_id = CARRIER_MAP.get(str(q["carrier"]).lower())
+        if not order_info or not carrier_id:
+            results[idx] = ([], q.get("is_residential", False))
+            continue
+
+        # In flight elsewhere, or the same quote twice in this batch (two orders, same SKU and address)
+        call, leader = _quote_flight.claim(cache_key)
+        if not leader:
+            waiting.append((idx, call))
+            continue
+        claimed.append((cache_key, call, q))
+        shapes.setdefault(_shipment_shape(q, order_info), []).append((idx, q, cache_key, order_info, carrier_id, call))
+
+    try:
+        groups = list(shapes.values())
+        chunks = {}
+        for start in range(0, len(groups), SHIPMENT_BATCH_SIZE):
+            chunk = groups[start:start + SHIPMENT_BATCH_SIZE]
+            future = pool.submit(_rate_shipment_batch, chunk)
+            futures[future] = [entry[0] for group in chunk for entry in group]
+            chunks[future] = chunk
+
+        for future in as_completed(futures):
+            if future in chunks:
+                entries = [entry for group in chunks[future] for entry in group]
+                for (idx, q, cache_key, _, _, call), res in zip(entries, future.result()):
+                    rate_cache.put(cache_key, res[0], res[1])
+                    rate_card.record(q["carrier"], q["pkg"], q["weight"], q.get("dims"), q.get("to_zip"), res[0], res[1], "shipment")
+                    _quote_flight.resolve(cache_key, call, result=res)
+                    results[idx] = copy.deepcopy(res)
+            else:
+                results[futures[future][0]] = future.result()
+    finally:
+        # Never leave a claimed quote unresolved, or its waiters would block forever
+        for cache_key, call, q in claimed:
+            _quote_flight.resolve(cache_key, call, result=([], q.get("is_residential", False)))
+
+    for idx, call in waiting:
+        try:
+            results[idx] = _quote_flight.wait(call)
+        except Exception as e:
+            print(f"Shared quote failed for {quotes[idx].get('order_no')}: {e}")
+            results[idx] = ([], quotes[idx].get("is_residential", False))
+
+    return results
+
+def _shipment_shape(q, order_info):
+    """What a temporary shipment is made of: one per address + package shape, whatever carrier/service rates it."""
+    try:
+        weight = float(q["weight"])
+    except (TypeError, ValueError):
+        weight = str(q["weight"])
+    dims = tuple(float(d) for d in q["dims"]) if q.get("dims") else None
+    return (rate_cache.normalize_address(order_info.get("ship_to")), str(q.get("to_state")), str(q.get("to_zip"))[:5], weight, dims)
+
+def _get_quote_pool():
+    """
+        Shared, bounded executor for individual quotes. Order workers in main.py block on it but
+        quote tasks never submit to it themselves, so nesting can't deadlock.
+    """
+    global _quote_pool
+    if _quote_pool is None:
+        with _quote_pool_lock:
+            if _quote_pool is None:
+                _quote_pool = ThreadPoolExecutor(max_workers=QUOTE_WORKERS, thread_name_prefix="quote")
+    return _quote_pool
+
+def _rate_shipment_batch(groups):
+    """
+        Creates one temporary shipment per shape group, bulk-rates each for all of its carriers and
+        queues the cancellations. Every quote in a group is answered from its shipment's rates.
+        Returns: (rates, is_residential) per quote, in group order
+    """
+    headers = {
+        "api-key": V2_API_KEY,
+        "Content-Type": "application/json"
+    }
+    empty = [([], q.get("is_residential", False)) for group in groups for _, q, _, _, _, _ in group]
+
+    payload = {"shipments": [
+        _shipment_payload(order_info["ship_to"], q.get("to_state"), q.get("to_zip"), q["weight"], q.get("dims"))
+        for _, q, _, order_info, _, _ in (group[0] for group in groups)
+    ]}
+
+    try:
+        ship_response = session.post(SHIPMENT_URL, json=payload, headers=headers)
+        if ship_response.status_code != 200:
+            print(f"Batch Shipment Creation Failed: {ship_response.text}")
+            return empty
+
+        shipments_list = ship_response.json().get("shipments", [])
+        shipment_ids = [s.get("shipment_id") for s in shipments_list]
+        for s_id in shipment_ids:
+            if s_id:
+                queue_cancel(s_id)
+
+        if len(shipments_list) != len(groups):
+            print(f"Error: batch created {len(shipments_list)} shipments for {len(groups)} shapes")
+            return empty
+
+        # One bulk rate call per carrier combination; each response entry is matched back by shipment_id
+        by_carriers = defaultdict(list)
+        for s_id, group in zip(shipment_ids, groups):
+            if s_id:
+                by_carriers[tuple(sorted({carrier_id for _, _, _, _, carrier_id, _ in group}))].append(s_id)
+
+        rates_by_shipment = {}
+        for carrier_ids, ids in by_carriers.items():
+            rates_by_shipment.update(_bulk_rates(ids, list(carrier_ids), headers))
+
+        results = []
+        for shipment, group in zip(shipments_list, groups):
+            rates = rates_by_shipment.get(shipment.get("shipment_id"), [])
+            is_residential = _is_residential(shipment)
+            for _, q, _, _, carrier_id, _ in group:
+                carrier_rates = [r for r in rates if _rate_carrier_id(r) == carrier_id]
+                results.append((_standardize_rates(carrier_rates, q.get("service"), q["pkg"]), is_residential))
+        return results
+    except Exception as e:
+        print(f"V2 Batch Connection Error: {e}")
+        return empty
+
+def _rate_carrier_id(rate):
+    """carrier_id of a raw V2 rate (falls back on its carrier_code)."""
+    if rate.get("carrier_id"):
+        return rate["carrier_id"]
+    return CARRIER_MAP["ups" if "ups" in str(rate.get("carrier_code")).lower() else "usps"]
+
+def _bulk_rates(shipment_ids, carrier_ids, headers):
+    """
+        Rates many existing shipments in one /v2/rates/bulk call.
+        Falls back to one /v2/rates call per shipment if the bulk endpoint is refused.
+        Returns: {shipment_id: [raw rates]}
+    """
+    bulk_payload = {"shipment_ids": shipment_ids, "rate_options": {"carrier_ids": carrier_ids}}
+    response = session.post(BULK_RATES_URL, json=bulk_payload, headers=headers)
+
+    if response.status_code == 200:
+        rates_by_shipment = {}
+        for item in response.json():
+            rates = item.get("rates") or item.get("rate_response", {}).get("rates", [])
+            rates_by_shipment[item.get("shipment_id")] = rates
+        return rates_by_shipment
+
+    print(f"Bulk rate V2 Error {response.status_code}: {response.text}. Rating one by one.")
+    rates_by_shipment = {}
+    for s_id in shipment_ids:
+        rate_response = session.post(RATES_URL, json={"shipment_id": s_id, "rate_options": {"carrier_ids": carrier_ids}}, headers=headers)
+        if rate_response.status_code == 200:
+            rates_by_shipment[s_id] = rate_response.json().get("rate_response", {}).get("rates", [])
+    return rates_by_shipment
+
+def _cancel_worker():
+    headers = {"api-key": V2_API_KEY}
+    while True:
+        shipment_id = _cancel_queue.get()
+        try:
+            cancel_url = f"https://api.shipstation.com/v2/shipments/{shipment_id}/cancel"
+            res = session.put(cancel_url, headers=headers)
+            if res.status_code >= 400:
+                print(f"Cancel failed for temporary shipment {shipment_id}: {res.status_code}")
+        except Exception as e:
+            print(f"Cancel error for temporary shipment {shipment_id}: {e}")
+        finally:
+            _cancel_queue.task_done()
+
+def queue_cancel(shipment_id):
+    """
+        Hands a temporary rating shipment to the background cleanup workers so the cancel PUT
+        stays off the quote's critical path.
+    """
+    global _cancel_workers_started
+    if not _cancel_workers_started:
+        with _cancel_start_lock:
+            if not _cancel_workers_started:
+                for _ in range(CANCEL_WORKERS):
+                    threading.Thread(target=_cancel_worker, name="shipment-cancel", daemon=True).start()
+                _cancel_workers_started = True
+    _cancel_queue.put(shipment_id)
+
+def flush_cancellations():
+    """Blocks until every queued temporary shipment has been cancelled. Call at the end of a run."""
+    if _cancel_workers_started:
+        _cancel_queue.join()
+
+def cache_orders(orders):
+    """
+        Replaces the run-scoped order cache with the orders already fetched by get_shipments(),
+        so rate calls don't have to re-fetch each order from V1.
+        Used: main.py (extract_todays_shipments)
+    """
+    with _order_cache_lock:
+        ORDER_CACHE.clear()
+        for order in orders:
+            order_no = order.get("orderNumber")
+            if order_no is None:
+                continue
+            ORDER_CACHE[str(order_no)] = {
+                "order_id": order.get("orderId"),
+                "ship_to": order.get("shipTo")
+            }
+
 def get_order_address(order_no):
+    """
+        Returns {"order_id", "ship_to"} for an order. Served from ORDER_CACHE when the order
+        was part of this run's get_shipments() fetch, otherwise falls back to a V1 lookup.
+    """
+    cached = ORDER_CACHE.get(str(order_no))
+    if cached:
+        return cached
+
     url = f"https://ssapi.shipstation.com/orders?orderNumber={order_no}"
 
-    response = requests.get(url, auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET))
+    response = session.get(url, auth=(V1_SHIPSTATION_API_KEY, V1_SHIPSTATION_API_SECRET))
 
     if response.status_code == 200:
         data = response.json()
         if data.get('orders'):
             # V1 returns a list; we grab the first match
             order = data['orders'][0]
-            
-            return {
+
+            order_info = {
                 "order_id": order.get("orderId"),
                 "ship_to": order.get("shipTo")
             }
+            with _order_cache_lock:
+                ORDER_CACHE[str(order_no)] = order_info
+            return order_info
     return None
 
 def get_rate_estimate(carrier_id, service, pkg, weight, dims, to_state, to_zip, addr):
@@ -249,7 +603,7 @@ def get_rate_estimate(carrier_id, service, pkg, weight, dims, to_state, to_zip,
         "ship_date": ship_date_str
     }
 
-    if pkg in ['flat_rate_padded_envelope', 'flat_rate_envelope', 'medium_flat_rate_box', 'large_flat_rate_box']:
+    if pkg in FLAT_RATE_CODES:
         payload["package_code"] = pkg
     else:
         payload["dimensions"] = {
@@ -260,7 +614,7 @@ def get_rate_estimate(carrier_id, service, pkg, weight, dims, to_state, to_zip,
         }
 
     try:
-        response = requests.post(URL, json=payload, headers=headers)
+        response = session.post(URL, json=payload, headers=headers)
         if response.status_code == 200:
             rates = response.json()
             
@@ -285,7 +639,7 @@ def get_rate_estimate(carrier_id, service, pkg, weight, dims, to_state, to_zip,
                             continue
                     else:
                         # For Ground/UPS, 'package' and 'parcel' are the same thing
-                        if target_pkg == "package" and current_api_pkg not in ["package", "parcel"]:
+                        if target_pkg == "package" and current_api_pkg not in ["package", "parcel", ""]:
                             continue
                         elif target_pkg != "package" and current_api_pkg != target_pkg:
                             continue
@@ -0,0 +1,104 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.shipstation import rate_limit
+
+V1_HOST = "ssapi.shipstation.com"
+V2_HOST = "api.shipstation.com"
+
+# Matches the V1 concurrency ceiling; V2 pools are sized to rate_limit.V2_MAX_CONCURRENCY
+MAX_WORKERS = rate_limit.V1_MAX_CONCURRENCY
+
+# How many times a request that came back 429 is re-sent after the limiter's pause
+MAX_THROTTLE_RETRIES = 3
+
+# (connect, read) seconds. Used whenever a caller doesn't pass its own timeout
+DEFAULT_TIMEOUT = (5, 30)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _build_session(pool_size):
+    """
+        Creates a requests.Session with a keep-alive pool sized to the host's concurrency ceiling.
+        Idempotent calls (GET/PUT/DELETE) are retried with backoff on 5xx; POSTs only retry
+        when the connection was never established so we never double-create a shipment/label.
+        429s are left to the rate limiter (see request()).
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=2,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=["GET", "PUT", "DELETE", "HEAD", "OPTIONS"],
+        raise_on_status=False,
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size * 2, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session(host):
+    """
+        Returns the shared Session for a ShipStation host (one pool for V1, one for V2).
+        Sessions are created once and reused by every thread.
+    """
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                limiter = _limiter_for(host)
+                session = _build_session(limiter.max_concurrency if limiter else MAX_WORKERS)
+                _sessions[host] = session
+    return session
+
+def _limiter_for(host):
+    if host == V1_HOST:
+        return rate_limit.V1
+    if host == V2_HOST:
+        return rate_limit.V2
+    return None
+
+def request(method, url, **kwargs):
+    """
+        Drop-in replacement for requests.request that routes through the pooled session
+        for the url's host and applies DEFAULT_TIMEOUT when none is given.
+
+        V1/V2 calls wait for their rate limiter first. A 429 means ShipStation rejected the call
+        before doing anything, so it's safe to re-send (even a POST) once the limiter's pause ends.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    host = urlsplit(url).hostname or ""
+    session = get_session(host)
+    limiter = _limiter_for(host)
+
+    if limiter is None:
+        return session.request(method, url, **kwargs)
+
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        limiter.acquire()
+        response = None
+        try:
+            response = session.request(method, url, **kwargs)
+        finally:
+            limiter.release(response)
+        if response.status_code != 429:
+            break
+    return response
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
@@ -0,0 +1,64 @@
+import copy
+import threading
+
+class SingleFlight:
+    """
+        Collapses concurrent calls that share a key into one execution.
+
+        The first caller for a key runs fn(); anyone asking for the same key while it's in flight
+        waits and gets the same result (or exception). Each caller gets its own deep copy, because
+        rate dicts are mutated downstream (dim_source, winning_pkg_str, ...).
+
+        do() covers the one-call case. Callers that produce many keys' results in one go (the batch
+        rate path) use claim() / resolve() / wait() directly so other callers can wait on their keys too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def claim(self, key):
+        """
+            Registers interest in key. Returns (call, leader): the leader must resolve() the call;
+            everyone else wait()s on it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+                return call, True
+            self.shared += 1
+            return call, False
+
+    def resolve(self, key, call, result=None, error=None):
+        """Publishes the leader's result (or error) and releases the waiters. Safe to call twice."""
+        if call["event"].is_set():
+            return
+        call["result"], call["error"] = result, error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call["event"].set()
+
+    def wait(self, call):
+        """Blocks until the call is resolved. Returns a private copy of its result or raises its error."""
+        call["event"].wait()
+        if call["error"] is not None:
+            raise call["error"]
+        return copy.deepcopy(call["result"])
+
+    def do(self, key, fn):
+        call, leader = self.claim(key)
+        if leader:
+            try:
+                result = fn()
+            except BaseException as e:
+                # Waiters get the error too; an interrupt still propagates in the leader
+                self.resolve(key, call, error=e)
+                if not isinstance(e, Exception):
+                    raise
+            else:
+                self.resolve(key, call, result=result)
+        return self.wait(call)
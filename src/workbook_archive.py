@@ -0,0 +1,108 @@
+import os
+from copy import copy
+from datetime import date
+from openpyxl import Workbook, load_workbook
+import config
+
+# Where finished daily sheets go, one file per day (daily_YYYY-MM-DD.xlsx)
+ARCHIVE_DIR = getattr(config, "ARCHIVE_DIR", "data/archive")
+
+def _sheet_date(day, today):
+    """
+        Daily sheets are named by day of month only. A day up to today is this month;
+        a later day is left over from an earlier month (the latest one that has that day).
+    """
+    year, month = today.year, today.month
+    if day > today.day:
+        month -= 1
+    while True:
+        if month < 1:
+            year, month = year - 1, 12
+        try:
+            return date(year, month, day)
+        except ValueError:
+            month -= 1
+
+def old_daily_sheets(sheetnames, today=None):
+    """Names of daily (numeric) sheets other than today's."""
+    today = today or date.today()
+    return [name for name in sheetnames if name.isdigit() and name != str(today.day)]
+
+def _copy_sheet(source, target):
+    """
+        Copies one worksheet's values, cell formatting, merges, row/column sizes and print
+        settings onto an empty worksheet of another workbook (openpyxl only copies within a workbook).
+    """
+    for row in source.iter_rows():
+        for cell in row:
+            if cell.value is None and not cell.has_style:
+                continue
+            new_cell = target.cell(row=cell.row, column=cell.column, value=cell.value)
+            if cell.has_style:
+                new_cell.font = copy(cell.font)
+                new_cell.fill = copy(cell.fill)
+                new_cell.border = copy(cell.border)
+                new_cell.alignment = copy(cell.alignment)
+                new_cell.protection = copy(cell.protection)
+                new_cell.number_format = cell.number_format
+
+    for merged in source.merged_cells.ranges:
+        target.merge_cells(str(merged))
+    for key, dim in source.column_dimensions.items():
+        target.column_dimensions[key].width = dim.width
+        target.column_dimensions[key].hidden = dim.hidden
+    for key, dim in source.row_dimensions.items():
+        target.row_dimensions[key].height = dim.height
+        target.row_dimensions[key].hidden = dim.hidden
+
+    target.sheet_format = copy(source.sheet_format)
+    target.page_setup = copy(source.page_setup)
+    target.print_options = copy(source.print_options)
+    target.page_margins = copy(source.page_margins)
+    target.freeze_panes = source.freeze_panes
+    if source.print_area:
+        target.print_area = source.print_area
+
+def archive_old_daily_sheets(workbook_path, today=None):
+    """
+        Moves every daily sheet except today's out of the working workbook into
+        ARCHIVE_DIR/daily_YYYY-MM-DD.xlsx, so the workbook only keeps today, 'Copy',
+        'Decision Log' and 'List Algorithm' and stays small all month.
+
+        Each archive is written before anything is removed from the working workbook,
+        so an interrupted run loses nothing (re-running just rewrites the archive).
+
+        Returns: list of archive file paths written
+        Used: main.py (before write_grouped_excel loads the workbook)
+    """
+    today = today or date.today()
+    try:
+        # read_only only parses the workbook index, so the common "nothing to archive" case stays cheap
+        index_wb = load_workbook(workbook_path, read_only=True)
+    except FileNotFoundError:
+        return []
+    old_sheets = old_daily_sheets(index_wb.sheetnames, today)
+    index_wb.close()
+    if not old_sheets:
+        return []
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    written = []
+    # One full load: each old sheet is copied out into its own archive, then removed here
+    wb = load_workbook(workbook_path)
+    for name in old_sheets:
+        archive_path = os.path.join(ARCHIVE_DIR, f"daily_{_sheet_date(int(name), today).isoformat()}.xlsx")
+
+        archive_wb = Workbook()
+        _copy_sheet(wb[name], archive_wb.active)
+        archive_wb.active.title = name
+        archive_wb.save(archive_path)
+        written.append(archive_path)
+
+    for name in old_sheets:
+        del wb[name]
+    wb.active = 0
+    wb.save(workbook_path)
+
+    print(f"Archived {len(written)} daily sheet(s) to {ARCHIVE_DIR}")
+    return written
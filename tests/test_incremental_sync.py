@@ -0,0 +1,118 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from datetime import datetime
+from unittest import mock
+
+from src import main
+from src.shipping import decision_store
+
+
+def frozen_datetime(now):
+    """A datetime class whose now() is pinned to the aware datetime now."""
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now.astimezone(tz)
+    return FrozenDatetime
+
+
+def order(order_id, status="awaiting_shipment", **extra):
+    return {"orderId": order_id, "orderNumber": f"SO-{order_id}", "orderStatus": status, **extra}
+
+
+class IncrementalSyncTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.object(decision_store, "STORE_PATH", os.path.join(tmp.name, "decisions.sqlite")),
+            mock.patch.object(decision_store, "_initialized", False),
+            mock.patch.object(main, "SHIPSTATION_TZ", main.ZoneInfo("America/Los_Angeles")),
+            mock.patch.object(main, "set_awaiting_count"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.get_shipments = mock.Mock(return_value=[])
+        patcher = mock.patch.object(main, "get_shipments", self.get_shipments)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use_local_timezone(self, name):
+        """Runs the test as if this machine's clock were set to another zone."""
+        self.addCleanup(time.tzset)
+        patcher = mock.patch.dict(os.environ, {"TZ": name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        time.tzset()
+
+    def sync(self, now):
+        with mock.patch.object(main, "datetime", frozen_datetime(datetime.fromisoformat(now))), \
+             redirect_stdout(io.StringIO()):
+            return main.fetch_awaiting_orders()
+
+    def test_modify_date_start_is_account_time_minus_the_overlap(self):
+        self.use_local_timezone("Asia/Tokyo")
+        decision_store.save_order_snapshot([order(1)], "2026-10-14T15:30:00+00:00")   # 08:30 in LA
+
+        self.sync("2026-10-14T10:00:00-07:00")
+
+        self.get_shipments.assert_called_once_with(modify_date_start="2026-10-14 08:20:00")
+
+    def test_legacy_naive_sync_time_is_read_as_local_time(self):
+        self.use_local_timezone("America/New_York")
+        decision_store.save_order_snapshot([order(1)], "2026-10-14T12:00:00")         # 09:00 in LA
+
+        self.sync("2026-10-14T10:00:00-07:00")
+
+        self.get_shipments.assert_called_once_with(modify_date_start="2026-10-14 08:50:00")
+
+    def test_first_sync_of_the_account_day_is_a_full_fetch(self):
+        # Same UTC date, but yesterday in the account's zone
+        decision_store.save_order_snapshot([order(1)], "2026-10-14T23:30:00-07:00")
+        self.get_shipments.return_value = [order(2)]
+
+        orders = self.sync("2026-10-15T00:10:00-07:00")
+
+        self.get_shipments.assert_called_once_with()
+        self.assertEqual([o["orderId"] for o in orders], [2])
+
+    def test_no_snapshot_is_a_full_fetch(self):
+        self.sync("2026-10-14T10:00:00-07:00")
+        self.get_shipments.assert_called_once_with()
+
+    def test_full_fetch_when_not_incremental(self):
+        decision_store.save_order_snapshot([order(1)], "2026-10-14T09:00:00-07:00")
+        with mock.patch.object(main, "datetime", frozen_datetime(datetime.fromisoformat("2026-10-14T10:00:00-07:00"))), \
+             redirect_stdout(io.StringIO()):
+            main.fetch_awaiting_orders(incremental=False)
+        self.get_shipments.assert_called_once_with()
+
+    def test_changed_orders_are_patched_into_the_snapshot(self):
+        decision_store.save_order_snapshot(
+            [order(1), order(2, shipTo="old"), order(3)], "2026-10-14T09:00:00-07:00"
+        )
+        self.get_shipments.return_value = [
+            order(2, shipTo="new"),     # still awaiting, edited
+            order(3, status="shipped"),  # left awaiting_shipment
+            order(4),                    # new
+        ]
+
+        orders = self.sync("2026-10-14T10:00:00-07:00")
+
+        by_id = {o["orderId"]: o for o in orders}
+        self.assertEqual(sorted(by_id), [1, 2, 4])
+        self.assertEqual(by_id[2]["shipTo"], "new")
+        main.set_awaiting_count.assert_called_once_with(3)
+
+        synced_at, snapshot = decision_store.load_order_snapshot()
+        self.assertEqual(synced_at, "2026-10-14T10:00:00-07:00")
+        self.assertEqual(sorted(o["orderId"] for o in snapshot), [1, 2, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
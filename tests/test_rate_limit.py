@@ -0,0 +1,149 @@
+import io
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from src.shipstation import rate_limit
+from src.shipstation.rate_limit import RateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def acquire_in_thread(limiter):
+    """Starts limiter.acquire() on a thread; returns an Event set once it got through."""
+    acquired = threading.Event()
+
+    def run():
+        limiter.acquire()
+        acquired.set()
+
+    threading.Thread(target=run, daemon=True).start()
+    return acquired
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        quiet = redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+
+    def test_bucket_starts_at_the_concurrency_burst_not_a_full_minute(self):
+        limiter = RateLimiter("test", 200, 15)
+        self.assertEqual(limiter.tokens, 15)
+
+        for _ in range(15):
+            limiter.acquire()
+            limiter.release()
+        self.assertLess(limiter.tokens, 1)
+
+    def test_refill_never_exceeds_capacity(self):
+        limiter = RateLimiter("test", 600, 5)
+        limiter.tokens = 0
+        limiter._refill(limiter._last_refill + 3600)
+        self.assertEqual(limiter.tokens, 5)
+
+    def test_empty_bucket_blocks_until_refilled(self):
+        limiter = RateLimiter("test", 60, 2)   # one token per second
+        limiter.acquire()
+        limiter.release()
+        limiter.acquire()
+        limiter.release()
+
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.5)
+
+    def test_in_flight_limit_blocks_until_a_slot_is_released(self):
+        limiter = RateLimiter("test", 6000, 1)
+        limiter.tokens = 5
+        limiter.capacity = 5
+        limiter.acquire()
+
+        acquired = acquire_in_thread(limiter)
+        self.assertFalse(acquired.wait(0.1))
+
+        limiter.release(FakeResponse())
+        self.assertTrue(acquired.wait(2))
+
+    def test_429_pauses_halves_concurrency_and_empties_the_bucket(self):
+        limiter = RateLimiter("test", 200, 16)
+        limiter.acquire()
+        limiter.release(FakeResponse(429, {"Retry-After": "30"}))
+
+        snapshot = limiter.snapshot()
+        self.assertEqual(snapshot["concurrency"], 8)
+        self.assertEqual(snapshot["tokens"], 0)
+        self.assertEqual(snapshot["throttled"], 1)
+        self.assertGreater(limiter.paused_until - time.monotonic(), 25)
+
+    def test_paused_limiter_blocks_callers(self):
+        limiter = RateLimiter("test", 6000, 4)
+        limiter.paused_until = time.monotonic() + 0.3
+
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+    def test_remaining_header_resyncs_tokens_down(self):
+        limiter = RateLimiter("test", 200, 15)
+        limiter.acquire()
+        limiter.release(FakeResponse(200, {"X-Rate-Limit-Remaining": "3", "X-Rate-Limit-Reset": "20"}))
+        self.assertLessEqual(limiter.tokens, 3)
+
+    def test_exhausted_budget_pauses_until_reset(self):
+        limiter = RateLimiter("test", 200, 15)
+        limiter.acquire()
+        limiter.release(FakeResponse(200, {"X-Rate-Limit-Remaining": "0", "X-Rate-Limit-Reset": "12"}))
+        self.assertGreater(limiter.paused_until - time.monotonic(), 10)
+
+    def test_concurrency_backs_off_when_low_and_grows_back_with_headroom(self):
+        limiter = RateLimiter("test", 200, 10)
+
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(FakeResponse(200, {"X-Rate-Limit-Remaining": "5"}))   # under 10% of 200
+        self.assertEqual(limiter.current_concurrency(), 7)
+
+        for _ in range(10):
+            limiter.tokens = limiter.capacity
+            limiter.acquire()
+            limiter.release(FakeResponse(200, {"X-Rate-Limit-Remaining": "150"}))  # over 25%
+        self.assertEqual(limiter.current_concurrency(), 10)
+
+    def test_concurrency_never_drops_below_one(self):
+        limiter = RateLimiter("test", 200, 2)
+        for _ in range(5):
+            limiter._observe(FakeResponse(429, {"Retry-After": "0"}))
+        self.assertEqual(limiter.current_concurrency(), 1)
+
+
+class OrderWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        quiet = redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+
+    def test_follows_the_v2_limiters_live_concurrency(self):
+        limiter = RateLimiter("V2", 200, 15)
+        with mock.patch.object(rate_limit, "V2", limiter):
+            self.assertEqual(rate_limit.order_workers(), 15)
+            limiter._observe(FakeResponse(429, {"Retry-After": "0"}))
+            self.assertEqual(rate_limit.order_workers(), 7)
+
+    def test_is_at_least_one(self):
+        limiter = RateLimiter("V2", 200, 15)
+        limiter.concurrency = 0
+        with mock.patch.object(rate_limit, "V2", limiter):
+            self.assertEqual(rate_limit.order_workers(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
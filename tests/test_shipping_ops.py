@@ -0,0 +1,205 @@
+import io
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import config
+from src.shipping import shipping_ops
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+        self.text = str(data)
+
+    def json(self):
+        if isinstance(self._data, Exception):
+            raise self._data
+        return self._data
+
+
+class FakeSession:
+    """
+        Stands in for src.shipstation.session: V1 carriers/orders lookups, createlabelfororder
+        and voidlabel. label_errors / void_errors map an orderId / shipmentId to what that call
+        should do instead of succeeding: an HTTP status, a response body, or an exception to raise.
+    """
+
+    def __init__(self, balance, orders, label_errors=None, void_errors=None):
+        self.balance = balance
+        self.orders = {o["orderNumber"]: o for o in orders}
+        self.label_errors = label_errors or {}
+        self.void_errors = void_errors or {}
+        self.created = []
+        self.voided = []
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        if url.endswith("/carriers"):
+            return FakeResponse(200, [{"code": "stamps_com", "balance": self.balance}])
+        order_no = url.split("orderNumber=")[1]
+        return FakeResponse(200, {"orders": [self.orders[order_no]] if order_no in self.orders else []})
+
+    def post(self, url, json=None, **kwargs):
+        if url.endswith("/orders/createlabelfororder"):
+            order_id = json["orderId"]
+            error = self.label_errors.get(order_id)
+            if isinstance(error, Exception):
+                raise error
+            if error is not None:
+                return FakeResponse(*error) if isinstance(error, tuple) else FakeResponse(error, {"Message": "boom"})
+            shipment_id = 9000 + order_id
+            with self._lock:
+                self.created.append(shipment_id)
+            cost = next(o["cost"] for o in self.orders.values() if o["orderId"] == order_id)
+            return FakeResponse(200, {"shipmentId": shipment_id, "shipmentCost": cost, "labelData": f"label-{order_id}"})
+
+        if url.endswith("/shipments/voidlabel"):
+            shipment_id = json["shipmentId"]
+            error = self.void_errors.get(shipment_id)
+            if isinstance(error, Exception):
+                raise error
+            with self._lock:
+                self.voided.append(shipment_id)
+            if error is not None:
+                return FakeResponse(200, {"approved": False, "message": "denied"}) if error == "denied" else FakeResponse(error, {})
+            return FakeResponse(200, {"approved": True})
+
+        raise AssertionError(f"unexpected POST {url}")
+
+
+def make_orders(costs):
+    return [{"orderNumber": f"100-{i}", "orderId": i, "cost": cost,
+             "shipTo": {"name": f"Customer {i}", "street1": "1 Main", "city": "X", "state": "NY", "postalCode": "10001"}}
+            for i, cost in enumerate(costs, start=1)]
+
+
+def log_rows(orders):
+    return [{"row": i + 2, "Order #": o["orderNumber"], "Shipping Status": None, "Shipping Cost": o["cost"],
+             "Decision": "usps_ground_advantage", "SKU Pkg": "10x8x4", "Weight": 2, "Dims": "10x8x4"}
+            for i, o in enumerate(orders)]
+
+
+class ShippingLabelAlgoTest(unittest.TestCase):
+
+    def run_batch(self, fake, orders, workers=1, rows=None):
+        """Runs shipping_label_algo against fake; returns (result, printed output, apply_log_updates mock, set_status mock)."""
+        out = io.StringIO()
+        with mock.patch.object(shipping_ops, "session", fake), \
+             mock.patch.object(shipping_ops, "LABEL_WORKERS", workers), \
+             mock.patch.object(shipping_ops, "read_decision_log", return_value=rows or log_rows(orders)), \
+             mock.patch.object(shipping_ops, "apply_log_updates") as apply_updates, \
+             mock.patch.object(shipping_ops, "merge_labels_to_pdf", return_value="labels.pdf"), \
+             mock.patch.object(shipping_ops.decision_store, "set_status") as set_status, \
+             mock.patch.object(config, "main_file", "PROGRAM.xlsx", create=True), \
+             mock.patch.object(config, "pkg_map", {}, create=True), \
+             mock.patch.object(config, "DIM_MAP", {}, create=True), \
+             redirect_stdout(out):
+            result = shipping_ops.shipping_label_algo("Decision Log")
+        return result, out.getvalue(), apply_updates, set_status
+
+    def test_success_marks_every_order_shipped(self):
+        orders = make_orders([8.0, 9.5, 4.25])
+        fake = FakeSession(100.0, orders)
+
+        result, _, apply_updates, set_status = self.run_batch(fake, orders, workers=3)
+
+        self.assertEqual(result, "labels.pdf")
+        self.assertEqual(sorted(fake.created), [9001, 9002, 9003])
+        self.assertEqual(fake.voided, [])
+        self.assertEqual(apply_updates.call_args.kwargs["status_updates"], {2: "SHIPPED", 3: "SHIPPED", 4: "SHIPPED"})
+        set_status.assert_called_once()
+
+    def test_failure_partway_voids_every_created_label(self):
+        orders = make_orders([8.0, 8.0, 8.0, 8.0])
+        fake = FakeSession(100.0, orders, label_errors={3: 500})
+
+        result, _, apply_updates, set_status = self.run_batch(fake, orders)
+
+        self.assertFalse(result)
+        # Labels 1 and 2 were bought before 3 failed; 4 is never started
+        self.assertEqual(fake.created, [9001, 9002])
+        self.assertEqual(sorted(fake.voided), [9001, 9002])
+        self.assertFalse(apply_updates.call_args.kwargs.get("status_updates"))
+        set_status.assert_not_called()
+
+    def test_concurrent_failure_voids_whatever_was_created(self):
+        orders = make_orders([5.0] * 12)
+        fake = FakeSession(100.0, orders, label_errors={6: 500})
+
+        result, _, _, _ = self.run_batch(fake, orders, workers=4)
+
+        self.assertFalse(result)
+        self.assertNotIn(9006, fake.created)
+        self.assertEqual(sorted(fake.voided), sorted(fake.created))
+
+    def test_cost_mismatch_voids_the_batch(self):
+        orders = make_orders([8.0, 8.0])
+        fake = FakeSession(100.0, orders)
+        rows = log_rows(orders)
+        rows[1]["Shipping Cost"] = 7.0
+
+        result, _, apply_updates, _ = self.run_batch(fake, orders, rows=rows)
+
+        self.assertFalse(result)
+        self.assertEqual(sorted(fake.voided), sorted(fake.created))
+        self.assertEqual(apply_updates.call_args.kwargs["cost_mismatches"], {3: 8.0})
+
+    def test_labels_that_fail_to_void_are_flagged_for_manual_void(self):
+        orders = make_orders([8.0, 8.0, 8.0, 8.0])
+        fake = FakeSession(100.0, orders, label_errors={4: 500},
+                           void_errors={9001: "denied", 9002: 500, 9003: ConnectionError("reset")})
+
+        result, printed, _, _ = self.run_batch(fake, orders)
+
+        self.assertFalse(result)
+        for order_no in ("100-1", "100-2", "100-3"):
+            self.assertIn(f"[MANUAL VOID] Order {order_no} ", printed)
+        self.assertNotIn("[MANUAL VOID] Order 100-4 ", printed)
+
+    def test_timed_out_label_is_flagged_for_manual_void(self):
+        orders = make_orders([8.0, 8.0, 8.0])
+        fake = FakeSession(100.0, orders, label_errors={2: TimeoutError("read timed out")})
+
+        result, printed, _, _ = self.run_batch(fake, orders)
+
+        self.assertFalse(result)
+        self.assertEqual(fake.voided, [9001])
+        self.assertIn("[MANUAL VOID] Order 100-2 ", printed)
+
+    def test_unreadable_label_response_is_flagged_for_manual_void(self):
+        orders = make_orders([8.0, 8.0])
+        fake = FakeSession(100.0, orders, label_errors={2: (200, ValueError("bad json"))})
+
+        result, printed, _, _ = self.run_batch(fake, orders)
+
+        self.assertFalse(result)
+        self.assertEqual(fake.voided, [9001])
+        self.assertIn("[MANUAL VOID] Order 100-2 ", printed)
+
+    def test_reservation_never_overdraws_the_wallet(self):
+        orders = make_orders([8.0, 8.0, 8.0])
+        fake = FakeSession(23.99, orders)
+
+        result, printed, _, _ = self.run_batch(fake, orders, workers=3)
+
+        self.assertFalse(result)
+        self.assertIn("INSUFFICIENT FUNDS", printed)
+        # The shortfall is found while reserving, before a single label is bought
+        self.assertEqual(fake.created, [])
+        self.assertEqual(fake.voided, [])
+
+    def test_reservation_allows_spending_the_exact_balance(self):
+        orders = make_orders([8.0, 8.0, 8.0])
+        fake = FakeSession(24.0, orders)
+
+        result, _, _, _ = self.run_batch(fake, orders, workers=3)
+
+        self.assertEqual(result, "labels.pdf")
+        self.assertEqual(len(fake.created), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from datetime import date
+from unittest import mock
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font
+
+from src import workbook_archive
+from src.workbook_archive import _sheet_date, archive_old_daily_sheets, old_daily_sheets
+
+
+class SheetDateTest(unittest.TestCase):
+
+    def test_day_up_to_today_is_this_month(self):
+        today = date(2026, 10, 17)
+        self.assertEqual(_sheet_date(17, today), date(2026, 10, 17))
+        self.assertEqual(_sheet_date(3, today), date(2026, 10, 3))
+
+    def test_later_day_is_last_month(self):
+        self.assertEqual(_sheet_date(28, date(2026, 10, 17)), date(2026, 9, 28))
+
+    def test_day_31_skips_back_past_short_months(self):
+        # No Sept 31: the leftover 31 is from August
+        self.assertEqual(_sheet_date(31, date(2026, 10, 5)), date(2026, 8, 31))
+        # No Feb 30/31 either
+        self.assertEqual(_sheet_date(30, date(2027, 3, 2)), date(2027, 1, 30))
+
+    def test_january_wraps_to_last_december(self):
+        self.assertEqual(_sheet_date(20, date(2027, 1, 4)), date(2026, 12, 20))
+
+
+class OldDailySheetsTest(unittest.TestCase):
+
+    def test_keeps_today_and_non_daily_sheets(self):
+        names = ["15", "16", "17", "Copy", "Decision Log", "List Algorithm"]
+        self.assertEqual(old_daily_sheets(names, date(2026, 10, 17)), ["15", "16"])
+
+
+class ArchiveOldDailySheetsTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = os.path.join(tmp.name, "archive")
+        self.workbook_path = os.path.join(tmp.name, "orders.xlsx")
+
+        patcher = mock.patch.object(workbook_archive, "ARCHIVE_DIR", self.archive_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def build_workbook(self):
+        wb = Workbook()
+        wb.active.title = "Copy"
+        for name in ("30", "16", "17"):
+            ws = wb.create_sheet(name)
+            ws["A1"] = f"Orders {name}"
+            ws["A1"].font = Font(bold=True)
+            ws["B2"] = 12.5
+            ws.merge_cells("A1:C1")
+            ws.column_dimensions["A"].width = 31
+        wb.create_sheet("Decision Log")
+        wb.save(self.workbook_path)
+
+    def archive(self, today):
+        with redirect_stdout(io.StringIO()):
+            return archive_old_daily_sheets(self.workbook_path, today)
+
+    def test_moves_old_sheets_into_dated_archives(self):
+        self.build_workbook()
+
+        written = self.archive(date(2026, 10, 17))
+
+        self.assertEqual(sorted(os.path.basename(path) for path in written),
+                         ["daily_2026-09-30.xlsx", "daily_2026-10-16.xlsx"])
+        self.assertEqual(load_workbook(self.workbook_path).sheetnames, ["Copy", "17", "Decision Log"])
+
+        archived = load_workbook(os.path.join(self.archive_dir, "daily_2026-09-30.xlsx"))
+        self.assertEqual(archived.sheetnames, ["30"])
+        ws = archived["30"]
+        self.assertEqual(ws["A1"].value, "Orders 30")
+        self.assertTrue(ws["A1"].font.bold)
+        self.assertEqual(ws["B2"].value, 12.5)
+        self.assertEqual([str(r) for r in ws.merged_cells.ranges], ["A1:C1"])
+        self.assertEqual(ws.column_dimensions["A"].width, 31)
+
+    def test_second_run_the_same_day_has_nothing_to_archive(self):
+        self.build_workbook()
+        self.archive(date(2026, 10, 17))
+        before = os.path.getmtime(self.workbook_path)
+
+        self.assertEqual(self.archive(date(2026, 10, 17)), [])
+        self.assertEqual(os.path.getmtime(self.workbook_path), before)
+        self.assertEqual(sorted(os.listdir(self.archive_dir)), ["daily_2026-09-30.xlsx", "daily_2026-10-16.xlsx"])
+
+    def test_missing_workbook_is_a_no_op(self):
+        self.assertEqual(self.archive(date(2026, 10, 17)), [])
+        self.assertFalse(os.path.exists(self.archive_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
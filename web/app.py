@@ -1,79 +1,141 @@
-from flask import Flask, render_template, jsonify, send_file
-import src.main as main
+import time
+_boot_start = time.perf_counter()
+
+from flask import Flask, render_template, jsonify, send_file, request, Response, stream_with_context
 import os
-from src.shipping.shipping_ops import shipping_label_algo
-import traceback
+import json
+import config
+from src import jobs
+
+# src.main / shipping_ops pull in pandas, openpyxl, reportlab and PyPDF2, so they're imported
+# inside the routes that need them; the index page renders without touching any of it
+STARTUP_BUDGET_SECONDS = 1.0
 
 app = Flask(__name__)
 
+_boot_seconds = time.perf_counter() - _boot_start
+print(f"App ready in {_boot_seconds:.2f}s (budget {STARTUP_BUDGET_SECONDS:.1f}s)")
+if _boot_seconds > STARTUP_BUDGET_SECONDS:
+    print("  [!] Startup over budget. Check `python -X importtime` for a new eager import.")
+
 @app.route("/")
 def index():
+    from src.shipstation.client import count_awaiting_shipments
+
+    # Cached; a stale value is returned as-is while it's refreshed in the background
+    awaiting_count, awaiting_age = count_awaiting_shipments()
+
+    return render_template(
+        "index.html",
+        awaiting_count=awaiting_count,
+        awaiting_age=None if awaiting_age is None else int(awaiting_age)
+    )
+
+# Each pipeline below runs as a background job (src/jobs.py); the routes only queue it.
+# All of them write config.main_file, so they share one writer slot.
+
+def _extract_job(resume, progress):
+    import src.main as main
+    result = main.extract_todays_shipments(resume=resume, progress=progress)
+    result["duration"] = f"{result.get("duration", 0)} minutes"
+    return result
 
-    awaiting_count = main.count_awaiting_shipments()
+def _algo_debug_job(progress):
+    import src.main as main
+    main.run_debug_list_algorithm(progress=progress)
+    return {"message": "List Algorithm updated successfully from the Daily Sheet!"}
 
-    return render_template("index.html", awaiting_count=awaiting_count)
+def _shipping_algo_job(progress):
+    from src.shipping.shipping_ops import shipping_label_algo
+    SHEET_NAME = "Decision Log"
+
+    result_pdf_path = shipping_label_algo(SHEET_NAME, progress=progress)
+    if not result_pdf_path or not os.path.exists(result_pdf_path):
+        raise RuntimeError("Batch failed. Check terminal.")
+    return {"message": "Labels created and merged.", "artifact": result_pdf_path}
+
+def _queued(job, created):
+    body = job.to_dict()
+    # Same job already queued/running on this workbook: hand back that one instead of a second run
+    body["coalesced"] = not created
+    return jsonify(body), 202
 
 @app.route("/run/extract", methods=["POST"])
 def run_extract():
-    try:
-        main.progress_status['percent'] = 0
-        result = main.extract_todays_shipments()
-        return jsonify({
-            "status": "success",
-            "duration": f"{result.get("duration", 0)} minutes"
-            })
-    except Exception as e:
-        # print to console
-        print("Error in run_extract:", e)
-        import traceback
-        traceback.print_exc()
-        return jsonify({"status": "error", "message": str(e)}), 500
-    
-@app.route("/run/algo_debug", methods=["POST"]) # Changed 'method' to 'methods'
+    # ?resume=1 finishes today's interrupted extract instead of starting over
+    return _queued(*jobs.submit("extract", _extract_job, request.args.get("resume") == "1", workbook=config.main_file))
+
+@app.route("/run/algo_debug", methods=["POST"])
 def run_algo_debug():
-    try:
-        # Simply call the function you already wrote in main.py
-        main.run_debug_list_algorithm()
-        
-        return jsonify({
-            "status": "success", 
-            "message": "List Algorithm updated successfully from the Daily Sheet!"
-        })
-    
-    except Exception as e:
-        # This will catch file-in-use errors or sheet-not-found errors
-        return jsonify({
-            "status": "error", 
-            "message": f"Algorithm failed: {str(e)}"
-        }), 500
-    
+    return _queued(*jobs.submit("algo_debug", _algo_debug_job, workbook=config.main_file))
+
 @app.route("/run/shipping_algo", methods=["POST"])
 def run_shipping_algo_route():
-    try:
-        SHEET_NAME = "Decision Log" 
-        
-        result_pdf_path = shipping_label_algo(SHEET_NAME)
-        
-        if result_pdf_path and os.path.exists(result_pdf_path):
-            # We send the file using a response object to ensure headers are clean
-            response = send_file(
-                result_pdf_path,
-                mimetype='application/pdf',
-                as_attachment=True,
-                download_name=os.path.basename(result_pdf_path)
-            )
-            # Disable caching to prevent the browser from trying to open a partially downloaded file
-            response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
-            return response
-        else:
-            return jsonify({"error": "Batch failed. Check terminal."}), 400
-            
-    except Exception as e:
-        print("--- CRITICAL ERROR IN SHIPPING ALGO ---")
-        print(traceback.format_exc()) 
-        return jsonify({"error": str(e)}), 500
+    return _queued(*jobs.submit("shipping_algo", _shipping_algo_job, workbook=config.main_file))
+
+@app.route("/jobs")
+def get_jobs():
+    return jsonify(jobs.list_jobs())
+
+@app.route("/jobs/<job_id>")
+def get_job_status(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+# Seconds between keep-alive events while a job's progress doesn't move
+EVENT_HEARTBEAT_SECONDS = 15
+
+@app.route("/jobs/<job_id>/events")
+def stream_job_events(job_id):
+    """Server-sent events: the job's status/progress each time it changes, until the job ends."""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+
+    def events():
+        version = None
+        while True:
+            version = job.progress.wait(version, timeout=EVENT_HEARTBEAT_SECONDS)["version"]
+            data = job.to_dict()
+            yield f"data: {json.dumps(data)}\n\n"
+            # The job runner sets the final status before finishing the progress, so this is the last event
+            if data["progress"]["finished"]:
+                return
+
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route("/jobs/<job_id>/result")
+def get_job_result(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    if job.active:
+        return jsonify({"status": job.status}), 202
+    if job.status == jobs.FAILED:
+        return jsonify({"status": job.status, "error": job.error}), 500
+    return jsonify({"status": job.status, "result": job.result})
+
+@app.route("/jobs/<job_id>/artifact")
+def get_job_artifact(job_id):
+    job = jobs.get_job(job_id)
+    if job is None or not job.artifact or not os.path.exists(job.artifact):
+        return jsonify({"error": f"No artifact for job {job_id}"}), 404
+
+    response = send_file(
+        job.artifact,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=os.path.basename(job.artifact)
+    )
+    # Disable caching to prevent the browser from trying to open a partially downloaded file
+    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+    response.headers["Pragma"] = "no-cache"
+    response.headers["Expires"] = "0"
+    return response
 
 @app.route('/download-test-pdf')
 def download_test_pdf():
@@ -83,16 +145,22 @@ def download_test_pdf():
         return send_file(pdf_path, as_attachment=True)
     return "File not found", 404
 
-@app.route('/progress')
-def get_progress():
-
-    data = dict(main.progress_status)
+@app.route('/orders/<order_no>/decision')
+def get_order_decision(order_no):
+    from src.shipping import decision_store
 
-    for key, value in data.items():
-        if isinstance(value,set):
-            data[key] = list(value)
+    record = decision_store.get_decision(order_no)
+    if record is None:
+        return jsonify({"error": f"No stored decision for order {order_no}"}), 404
+    return jsonify(record)
 
-    return jsonify(data)
+@app.route('/progress')
+def get_progress():
+    # Kept for older pages/scripts: the running (or last) job's progress, same "percent" key as before
+    job = jobs.latest_job()
+    if job is None:
+        return jsonify({"percent": 0})
+    return jsonify(job.progress.snapshot())
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file